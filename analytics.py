@@ -0,0 +1,223 @@
+"""
+Cost basis and P&L over the transactions ledger, computed with NumPy/pandas.
+
+Everything here works on whole columns at once instead of walking the ledger trade by
+trade, so a heavy trader's million-row history is a handful of array passes. Rows are
+first grouped by symbol (stable sort), after which every per-symbol running total is
+a segmented cumsum:
+
+- FIFO: under FIFO the first N shares sold are always the first N shares bought, so
+  the cost of any sale is a difference of one piecewise-linear curve (cumulative
+  bought shares -> cumulative cost), evaluated for every sell with a single np.interp.
+- Average cost: the basis follows basis = basis_prev * held_after / held_before on sells
+  and basis_prev + cost on buys, a linear recurrence solved with per-period running sums
+  (of logs for the products), so no error builds up across the whole history.
+- Time-weighted return: the portfolio is marked to the last traded price of each symbol
+  (the only price history we keep), trade cash flows are taken out of each
+  sub-period, and the final period is marked to current quotes.
+
+Imported lazily by the API so numpy/pandas stay out of worker start-up.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import db
+from models import Buy
+
+# How far (natural log) the running product of sell ratios may fall before we start a new chunk
+UNDERFLOW_GUARD = 500.0
+
+
+def load_ledger(user_id):
+    """The user's transactions as a DataFrame (symbol, shares, price, timestamp), oldest first"""
+    query = (select(Buy.symbol, Buy.shares, Buy.price, Buy.timestamp)
+             .where(Buy.user_id == user_id)
+             .order_by(Buy.timestamp, Buy.id))
+    with db.engine.connect() as conn:
+        ledger = pd.read_sql(query, conn)
+    ledger["price"] = ledger["price"].astype("float64")
+    ledger["shares"] = ledger["shares"].astype("int64")
+    return ledger
+
+
+def analyze(ledger, prices):
+    """
+    Per-symbol and total cost basis / P&L for a ledger, oldest trade first.
+
+    `prices` maps symbol -> current price. Symbols without one are marked at their
+    last trade price.
+    """
+    if ledger.empty:
+        return {"symbols": {}, "totals": _totals({}), "time_weighted_return": 0.0}
+
+    codes, symbols = pd.factorize(ledger["symbol"].to_numpy(), sort=False)
+    n_symbols = len(symbols)
+
+    # Lay the ledger out symbol by symbol (time order kept inside each symbol), so every
+    # per-symbol running total is a plain cumsum over a contiguous segment
+    # (int16 codes let numpy use a radix sort, most users hold far fewer than 32k symbols)
+    sort_codes = codes.astype(np.int16) if n_symbols < 2 ** 15 else codes
+    order = np.argsort(sort_codes, kind="stable")
+    codes = codes[order]
+    qty = ledger["shares"].to_numpy(dtype=np.int64)[order]
+    price = ledger["price"].to_numpy(dtype=np.float64)[order]
+    symbol_start = _segment_starts(codes != np.roll(codes, 1))
+
+    bought = np.where(qty > 0, qty, 0)
+    sold = np.where(qty < 0, -qty, 0)
+    held_after = _segment_cumsum(qty, symbol_start)
+    held_before = held_after - qty
+    symbol_end = np.append(np.flatnonzero(symbol_start)[1:], len(codes)) - 1
+    held = held_after[symbol_end]
+    last_price = price[symbol_end]
+    current = np.array([float(prices.get(s) or last_price[i]) for i, s in enumerate(symbols)])
+
+    fifo_realized, fifo_remaining = _fifo(codes, n_symbols, symbol_start, symbol_end,
+                                          bought, sold, price)
+    avg_realized, avg_remaining = _average_cost(codes, n_symbols, symbol_start, symbol_end,
+                                                qty, bought, sold, price, held_before, held_after)
+    twr = _time_weighted_return(order, symbol_start, qty, price, held_before, held, current)
+
+    market_value = held * current
+    report = {}
+    for i, symbol in enumerate(symbols):
+        report[symbol] = {
+            "shares": int(held[i]),
+            "price": float(current[i]),
+            "market_value": float(market_value[i]),
+            "fifo_cost": float(fifo_remaining[i]),
+            "average_cost": float(avg_remaining[i]),
+            "realized_fifo": float(fifo_realized[i]),
+            "realized_average": float(avg_realized[i]),
+            "unrealized_fifo": float(market_value[i] - fifo_remaining[i]),
+            "unrealized_average": float(market_value[i] - avg_remaining[i]),
+        }
+    return {"symbols": report, "totals": _totals(report), "time_weighted_return": twr}
+
+
+def _segment_starts(flags):
+    """Boolean mask of segment starts, the first row always starts one"""
+    flags = np.asarray(flags, dtype=bool).copy()
+    flags[0] = True
+    return flags
+
+
+def _segment_cumsum(values, starts):
+    """Running total of values that restarts at every segment start"""
+    total = np.cumsum(values)
+    return total - _carry_forward(total - values, starts)
+
+
+def _carry_forward(values, starts):
+    """values at each segment start, repeated over the rest of the segment"""
+    index = np.where(starts, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    return values[index]
+
+
+def _fifo(codes, n_symbols, symbol_start, symbol_end, bought, sold, price):
+    """Realized P&L per symbol and cost of the shares still held, FIFO"""
+    cum_bought = _segment_cumsum(bought, symbol_start)
+    cum_cost = _segment_cumsum(bought * price, symbol_start)
+    cum_sold = _segment_cumsum(sold, symbol_start)
+
+    # Give every symbol its own stretch of the number line so one np.interp serves them
+    # all. Rows are already grouped by symbol, so the knots come out sorted.
+    total_bought = cum_bought[symbol_end]
+    offsets = np.concatenate(([0.0], np.cumsum(total_bought + 1.0)[:-1]))
+    is_buy = bought > 0
+    buys_before = np.cumsum(is_buy) - is_buy
+    start_rows = np.flatnonzero(symbol_start)
+    # Knot layout: symbol 0's start knot, its buys, symbol 1's start knot, its buys...
+    knot_rows = buys_before[is_buy] + np.searchsorted(start_rows, np.flatnonzero(is_buy), side="right")
+    start_knots = buys_before[start_rows] + np.arange(n_symbols)
+    knots_x = np.empty(n_symbols + is_buy.sum())
+    knots_y = np.empty_like(knots_x)
+    knots_x[start_knots], knots_y[start_knots] = offsets, 0.0
+    knots_x[knot_rows] = offsets[codes[is_buy]] + cum_bought[is_buy]
+    knots_y[knot_rows] = cum_cost[is_buy]
+
+    is_sell = sold > 0
+    base = offsets[codes[is_sell]]
+    cost_sold = (np.interp(base + cum_sold[is_sell], knots_x, knots_y)
+                 - np.interp(base + cum_sold[is_sell] - sold[is_sell], knots_x, knots_y))
+    realized = np.bincount(codes[is_sell], weights=sold[is_sell] * price[is_sell] - cost_sold,
+                           minlength=n_symbols)
+
+    remaining = cum_cost[symbol_end] - np.interp(offsets + cum_sold[symbol_end], knots_x, knots_y)
+    return realized, remaining
+
+
+def _average_cost(codes, n_symbols, symbol_start, symbol_end, qty, bought, sold, price,
+                  held_before, held_after):
+    """Realized P&L per symbol and cost of the shares still held, average cost"""
+    # basis_t = scale_t * basis_{t-1} + added_t, with scale = held_after / held_before on sells.
+    # Unrolled: basis_t = growth_t * sum(added_k / growth_k), growth = running product of scale.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where((qty < 0) & (held_before > 0), held_after / held_before, 1.0)
+    closed = held_after <= 0
+    scale = np.where(closed, 1.0, scale)  # the closing row is forced to 0 below
+    added = bought * price
+    log_scale = np.log(scale)
+
+    # A holding period starts with each new symbol or whenever a buy lifts the position off
+    # zero, nothing carries over between periods. Long periods with lots of selling are cut
+    # into chunks before growth underflows, those chunks do carry the basis over.
+    period = np.cumsum(symbol_start | (held_before == 0))
+    log_growth = pd.Series(log_scale).groupby(period).cumsum().to_numpy()
+    chunk = np.floor(-(log_growth - log_scale) / UNDERFLOW_GUARD).astype(np.int64)
+    segment_start = _segment_starts((period != np.roll(period, 1)) | (chunk != np.roll(chunk, 1)))
+    segment = np.cumsum(segment_start)
+
+    # Per-group sums of same-signed terms, so no cancellation whatever the history length
+    growth = np.exp(pd.Series(log_scale).groupby(segment).cumsum().to_numpy())
+    basis = growth * pd.Series(added / growth).groupby(segment).cumsum().to_numpy()
+
+    carried = np.flatnonzero(segment_start & ~(symbol_start | (held_before == 0)))
+    if len(carried):
+        # Rare: walk the chunk boundaries in order, each picks up the previous chunk's basis
+        segment_end = np.append(np.flatnonzero(segment_start)[1:], len(segment)) - 1
+        carry = np.zeros(segment[-1] + 1)
+        for row in carried:
+            previous = segment[row] - 1
+            end = segment_end[previous - 1]
+            carry[segment[row]] = basis[end] + carry[previous] * growth[end]
+        basis = basis + carry[segment] * growth
+
+    basis = np.where(closed, 0.0, basis)
+    basis_before = np.where(symbol_start, 0.0, np.roll(basis, 1))
+    realized_rows = np.where(sold > 0, sold * price - (basis_before - basis), 0.0)
+    realized = np.bincount(codes, weights=realized_rows, minlength=n_symbols)
+    return realized, basis[symbol_end]
+
+
+def _time_weighted_return(order, symbol_start, qty, price, held_before, held, current):
+    """Chain-linked return of the stock holdings, with trade cash flows removed"""
+    previous_price = np.where(symbol_start, price, np.roll(price, 1))
+    repricing = held_before * (price - previous_price)
+
+    # Back to time order for the portfolio-level running value
+    in_time = np.empty_like(order)
+    in_time[order] = np.arange(len(order))
+    repricing = repricing[in_time]
+    flow = (qty * price)[in_time]
+
+    value_after = np.cumsum(repricing + flow)
+    value_start = np.concatenate(([0.0], value_after[:-1]))
+    value_before = value_start + repricing
+
+    valid = value_start > 1e-9
+    growth = np.ones(len(qty))
+    growth[valid] = value_before[valid] / value_start[valid]
+
+    final_value = float(np.dot(held, current))
+    if value_after[-1] > 1e-9:
+        growth = np.append(growth, final_value / value_after[-1])
+    return float(np.prod(growth) - 1)
+
+
+def _totals(report):
+    keys = ("market_value", "fifo_cost", "average_cost", "realized_fifo", "realized_average",
+            "unrealized_fifo", "unrealized_average")
+    return {key: float(sum(row[key] for row in report.values())) for key in keys}
@@ -0,0 +1,452 @@
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Annotated, Literal, Optional
+
+import msgspec
+from flask import Blueprint, Response, current_app, request, session
+
+from helpers import decode_cursor, encode_cursor, lookup, lookup_many, price_holdings
+from ledger import LedgerError, record_basket, record_buy, record_sell
+from database import db
+from http_cache import cache_policy
+from models import Buy, LeaderboardEntry, Position, RestingOrder, User
+from symbol_index import symbol_index
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+MAX_BATCH_SYMBOLS = 50
+MAX_BASKET_LEGS = 50
+MAX_PRICE_BARS = 10000
+MAX_SYMBOL_MATCHES = 25
+
+
+# --- Response and request types ---
+
+class Error(msgspec.Struct):
+    error: str
+
+
+class Holding(msgspec.Struct):
+    symbol: str
+    shares: int
+    price: float
+    value: float
+
+
+class Portfolio(msgspec.Struct):
+    cash: float
+    total_value: float
+    holdings: list[Holding]
+
+
+class Quote(msgspec.Struct):
+    symbol: str
+    name: str
+    price: float
+
+
+class QuoteBatch(msgspec.Struct):
+    quotes: list[Quote]
+    errors: dict[str, str]
+
+
+class Transaction(msgspec.Struct):
+    id: int
+    symbol: str
+    shares: int
+    price: float
+    timestamp: datetime
+
+
+class HistoryPage(msgspec.Struct):
+    transactions: list[Transaction]
+    next_cursor: Optional[str] = None
+
+
+class OrderRequest(msgspec.Struct, forbid_unknown_fields=True):
+    symbol: Annotated[str, msgspec.Meta(min_length=1, max_length=5)]
+    side: Literal["buy", "sell"]
+    shares: Annotated[int, msgspec.Meta(gt=0)]
+    type: Literal["market", "limit", "stop"] = "market"
+    price: Optional[Annotated[float, msgspec.Meta(gt=0)]] = None  # trigger for limit/stop
+
+
+class Order(msgspec.Struct):
+    symbol: str
+    side: str
+    shares: int
+    price: float
+    cash: float
+
+
+class SymbolAnalytics(msgspec.Struct):
+    symbol: str
+    shares: int
+    price: float
+    market_value: float
+    fifo_cost: float
+    average_cost: float
+    realized_fifo: float
+    realized_average: float
+    unrealized_fifo: float
+    unrealized_average: float
+
+
+class AnalyticsTotals(msgspec.Struct):
+    market_value: float
+    fifo_cost: float
+    average_cost: float
+    realized_fifo: float
+    realized_average: float
+    unrealized_fifo: float
+    unrealized_average: float
+
+
+class Analytics(msgspec.Struct):
+    symbols: list[SymbolAnalytics]
+    totals: AnalyticsTotals
+    time_weighted_return: float
+
+
+class PriceBars(msgspec.Struct):
+    symbol: str
+    timestamp: list[int]
+    open: list[float]
+    high: list[float]
+    low: list[float]
+    close: list[float]
+    volume: list[int]
+    next_start: Optional[int] = None
+
+
+class OpenOrder(msgspec.Struct):
+    id: int
+    symbol: str
+    side: str
+    type: str
+    shares: int
+    price: float
+    status: str
+    created_at: datetime
+    fill_price: Optional[float] = None
+    reason: Optional[str] = None
+
+
+class OpenOrders(msgspec.Struct):
+    orders: list[OpenOrder]
+
+
+class BasketRequest(msgspec.Struct, forbid_unknown_fields=True):
+    legs: Annotated[list[OrderRequest], msgspec.Meta(min_length=1, max_length=MAX_BASKET_LEGS)]
+
+
+class Fill(msgspec.Struct):
+    symbol: str
+    side: str
+    shares: int
+    price: float
+
+
+class Basket(msgspec.Struct):
+    fills: list[Fill]
+    cash: float
+
+
+class Standing(msgspec.Struct):
+    rank: int
+    username: str
+    value: float
+    cash: float
+    holdings_value: float
+
+
+class SymbolMatch(msgspec.Struct):
+    symbol: str
+    name: str
+
+
+class SymbolMatches(msgspec.Struct):
+    matches: list[SymbolMatch]
+
+
+class LeaderboardPage(msgspec.Struct):
+    standings: list[Standing]
+    total: int
+    me: Optional[Standing] = None
+    next_page: Optional[int] = None
+
+
+encoder = msgspec.json.Encoder()
+order_decoder = msgspec.json.Decoder(OrderRequest)
+basket_decoder = msgspec.json.Decoder(BasketRequest)
+
+
+def open_order(order):
+    return OpenOrder(id=order.id, symbol=order.symbol, side=order.side, type=order.order_type,
+                     shares=order.shares, price=order.trigger_price, status=order.status,
+                     created_at=order.created_at, fill_price=order.fill_price, reason=order.reason)
+
+
+def respond(payload, status=200):
+    """Encode a Struct straight to JSON bytes."""
+    return Response(encoder.encode(payload), status=status, mimetype="application/json")
+
+
+def api_login_required(f):
+    """Like helpers.login_required, but answers 401 instead of redirecting to the login page."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get("user_id") is None:
+            return respond(Error("login required"), 401)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# --- Endpoints ---
+
+@bp.route("/portfolio")
+@api_login_required
+def portfolio():
+    """Holdings priced at the current quote, plus cash and total value"""
+    user = User.query.get(session["user_id"])
+    if not user:
+        return respond(Error("user not found"), 404)
+
+    holdings = Position.holdings(user.id)
+    prices = price_holdings(user.id, holdings)
+    rows = [Holding(symbol, shares, prices[symbol], round(shares * prices[symbol], 2))
+            for symbol, shares in holdings.items()]
+    total_value = user.cash + sum(row.value for row in rows)
+    return respond(Portfolio(cash=user.cash, total_value=round(total_value, 2), holdings=rows))
+
+
+@bp.route("/quotes")
+@api_login_required
+def quotes():
+    """Batch quote: /api/v1/quotes?symbols=AAPL,MSFT"""
+    symbols = [s.strip().upper() for s in request.args.get("symbols", "").split(",") if s.strip()]
+    if not symbols:
+        return respond(Error("symbols is required"), 400)
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return respond(Error(f"at most {MAX_BATCH_SYMBOLS} symbols per request"), 400)
+
+    found, errors = [], {}
+    for symbol, quote in lookup_many(symbols).items():
+        if "price" in quote:
+            found.append(Quote(quote["symbol"], quote["name"], quote["price"]))
+        else:
+            errors[symbol] = quote.get("error", "quote not found")
+    return respond(QuoteBatch(quotes=found, errors=errors))
+
+
+@bp.route("/history")
+@api_login_required
+def history():
+    """One keyset page of history, newest first. Pass next_cursor back as ?before="""
+    try:
+        limit = min(int(request.args.get("limit", current_app.config["HISTORY_PAGE_SIZE"])), 500)
+    except ValueError:
+        return respond(Error("limit must be an integer"), 400)
+    if limit <= 0:
+        return respond(Error("limit must be positive"), 400)
+
+    rows, has_older, _ = Buy.history_page(session["user_id"], limit,
+                                          before=decode_cursor(request.args.get("before")))
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if rows and has_older else None
+    return respond(HistoryPage(
+        transactions=[Transaction(row.id, row.symbol, row.shares, float(row.price), row.timestamp)
+                      for row in rows],
+        next_cursor=next_cursor,
+    ))
+
+
+@bp.route("/leaderboard")
+@api_login_required
+def leaderboard():
+    """A page of the competition standings plus the caller's own rank: /api/v1/leaderboard?page=2"""
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = min(int(request.args.get("limit", current_app.config["LEADERBOARD_PAGE_SIZE"])), 500)
+    except ValueError:
+        return respond(Error("page and limit must be integers"), 400)
+    if page <= 0 or per_page <= 0:
+        return respond(Error("page and limit must be positive"), 400)
+
+    standings = [Standing(entry.rank, username, entry.value, entry.cash, entry.holdings_value)
+                 for entry, username in LeaderboardEntry.page(page, per_page)]
+    total = LeaderboardEntry.total()
+    me = None
+    mine = (db.session.query(LeaderboardEntry, User.username)
+            .join(User, User.id == LeaderboardEntry.user_id)
+            .filter(LeaderboardEntry.user_id == session["user_id"])
+            .first())
+    if mine is not None:
+        entry, username = mine
+        me = Standing(entry.rank, username, entry.value, entry.cash, entry.holdings_value)
+    return respond(LeaderboardPage(standings=standings, total=total, me=me,
+                                   next_page=page + 1 if page * per_page < total else None))
+
+
+@bp.route("/symbols")
+@api_login_required
+@cache_policy("private, max-age=300")
+def symbols():
+    """Autocomplete from the local listing: /api/v1/symbols?q=appl"""
+    try:
+        limit = min(int(request.args.get("limit", 10)), MAX_SYMBOL_MATCHES)
+    except ValueError:
+        return respond(Error("limit must be an integer"), 400)
+    if limit <= 0:
+        return respond(Error("limit must be positive"), 400)
+
+    matches = symbol_index.search(request.args.get("q", "")[:64], limit)
+    return respond(SymbolMatches(matches=[SymbolMatch(symbol, name) for symbol, name in matches]))
+
+
+@bp.route("/analytics")
+@api_login_required
+def analytics():
+    """Cost basis (FIFO and average), realized/unrealized P&L and time-weighted return"""
+    # numpy/pandas are only paid for by whoever asks for analytics
+    import analytics as engine
+
+    user_id = session["user_id"]
+    ledger = engine.load_ledger(user_id)
+    holdings = Position.holdings(user_id)
+    result = engine.analyze(ledger, price_holdings(user_id, holdings))
+    return respond(Analytics(
+        symbols=[SymbolAnalytics(symbol=symbol, **row) for symbol, row in result["symbols"].items()],
+        totals=AnalyticsTotals(**result["totals"]),
+        time_weighted_return=result["time_weighted_return"],
+    ))
+
+
+@bp.route("/prices/<symbol>")
+@api_login_required
+def price_bars(symbol):
+    """Stored OHLCV bars: /api/v1/prices/AAPL?start=<unix>&end=<unix>&limit=1000"""
+    from price_history import store
+
+    try:
+        limit = min(int(request.args.get("limit", 1000)), MAX_PRICE_BARS)
+    except ValueError:
+        return respond(Error("limit must be an integer"), 400)
+    if limit <= 0:
+        return respond(Error("limit must be positive"), 400)
+
+    try:
+        bars = store.range(symbol, request.args.get("start", type=int),
+                           request.args.get("end", type=int))
+    except ValueError as e:
+        return respond(Error(str(e)), 400)
+
+    next_start = int(bars.timestamp[limit]) if len(bars) > limit else None
+    page = [column[:limit].tolist() for column in bars]
+    return respond(PriceBars(symbol.upper(), *page, next_start=next_start))
+
+
+@bp.route("/orders")
+@api_login_required
+def list_orders():
+    """The user's open limit/stop orders, oldest first"""
+    orders = (RestingOrder.query
+              .filter_by(user_id=session["user_id"], status="open")
+              .order_by(RestingOrder.id)
+              .all())
+    return respond(OpenOrders([open_order(order) for order in orders]))
+
+
+@bp.route("/orders/<int:order_id>", methods=["DELETE"])
+@api_login_required
+def cancel_order(order_id):
+    """Cancel an open limit/stop order"""
+    # Conditional, so a cancel racing the matching engine either wins or sees the fill
+    cancelled = (RestingOrder.query
+                 .filter_by(id=order_id, user_id=session["user_id"], status="open")
+                 .update({"status": "cancelled", "closed_at": datetime.now(timezone.utc)},
+                         synchronize_session=False))
+    db.session.commit()
+    order = db.session.get(RestingOrder, order_id)
+    if not order or order.user_id != session["user_id"]:
+        return respond(Error("order not found"), 404)
+    if not cancelled:
+        return respond(Error(f"order is already {order.status}"), 409)
+    return respond(open_order(order))
+
+
+@bp.route("/orders", methods=["POST"])
+@api_login_required
+def place_order():
+    """Market order {"symbol": "AAPL", "side": "buy", "shares": 3}, add "type" and "price" for limit/stop"""
+    try:
+        order = order_decoder.decode(request.get_data())
+    except msgspec.ValidationError as e:
+        return respond(Error(str(e)), 400)
+    except msgspec.DecodeError:
+        return respond(Error("request body must be JSON"), 400)
+
+    quote = lookup(order.symbol)
+    if "price" not in quote:
+        return respond(Error(quote.get("error", "quote not found")), 400)
+
+    user_id = session["user_id"]
+    if order.type != "market":
+        if order.price is None:
+            return respond(Error(f"{order.type} orders need a price"), 400)
+        # Rests until matching.py sees the trigger crossed, cash/shares are checked at fill time
+        resting = RestingOrder(user_id=user_id, symbol=order.symbol.upper(), side=order.side,
+                               order_type=order.type, shares=order.shares, trigger_price=order.price)
+        db.session.add(resting)
+        db.session.commit()
+        return respond(open_order(resting), 201)
+
+    if quote.get("stale"):
+        # Fine for a resting order's sanity check above, not for trading at that price
+        return respond(Error("quotes are delayed right now, try again shortly"), 503)
+    trade = record_buy if order.side == "buy" else record_sell
+    try:
+        trade(user_id, order.symbol, order.shares, quote["price"])
+    except LedgerError as e:
+        return respond(Error(str(e)), 400)
+
+    return respond(Order(symbol=order.symbol.upper(), side=order.side, shares=order.shares,
+                         price=quote["price"], cash=User.query.get(user_id).cash), 201)
+
+
+@bp.route("/orders/basket", methods=["POST"])
+@api_login_required
+def place_basket():
+    """Many market orders, all or nothing: {"legs": [{"symbol": "AAPL", "side": "sell", "shares": 3}, ...]}"""
+    try:
+        basket = basket_decoder.decode(request.get_data())
+    except msgspec.ValidationError as e:
+        return respond(Error(str(e)), 400)
+    except msgspec.DecodeError:
+        return respond(Error("request body must be JSON"), 400)
+
+    if any(leg.type != "market" for leg in basket.legs):
+        return respond(Error("baskets only take market orders"), 400)
+
+    # One batched quote for every symbol in the basket
+    quotes = lookup_many({leg.symbol.upper() for leg in basket.legs})
+    missing = sorted(symbol for symbol, quote in quotes.items() if "price" not in quote)
+    if missing:
+        return respond(Error(f"no quote for {', '.join(missing)}"), 400)
+    if any(quote.get("stale") for quote in quotes.values()):
+        return respond(Error("quotes are delayed right now, try again shortly"), 503)
+
+    legs = []
+    for leg in basket.legs:
+        symbol = leg.symbol.upper()
+        shares = leg.shares if leg.side == "buy" else -leg.shares
+        legs.append((symbol, shares, quotes[symbol]["price"]))
+
+    user_id = session["user_id"]
+    try:
+        record_basket(user_id, legs)
+    except LedgerError as e:
+        return respond(Error(str(e)), 400)
+
+    fills = [Fill(symbol, leg.side, leg.shares, price)
+             for leg, (symbol, _, price) in zip(basket.legs, legs)]
+    return respond(Basket(fills=fills, cash=User.query.get(user_id).cash), 201)
@@ -1,9 +1,14 @@
+import csv
+import io
+import json
 import os
+import time
 from dotenv import load_dotenv
-from flask import Flask, flash, redirect, render_template, request, session
-from flask_session import Session
-from flask_migrate import Migrate, upgrade
+from flask import Flask, Response, flash, redirect, render_template, request, session, stream_with_context
+from flask_migrate import Migrate
 from datetime import datetime
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from sqlalchemy import text
 from werkzeug.security import check_password_hash, generate_password_hash
 
@@ -12,15 +17,27 @@ load_dotenv()
 app_logger_info = f"Working from: {os.getcwd()}"
 
 from database import db
-from helpers import apology, login_required, lookup, usd
-from models import User, Buy
+from helpers import (apology, decode_cursor, encode_cursor, login_required, lookup, price_holdings,
+                     quote_cache, quote_flights, quote_providers, usd)
+from models import User, Buy, LeaderboardEntry, Position
+import api
+import commands
+from fragments import fragment_cache, price_version
+import http_cache
+from http_cache import NO_STORE, cache_policy
+import sessions
+from metrics import metrics
+from price_feed import feed as price_feed
+from startup import upgrade_database
+from symbol_index import symbol_index
+from ledger import InsufficientFunds, InsufficientShares, record_buy, record_sell
 
 # Configure application
 app = Flask(__name__)
 
 # PRODUCTION-READY CONFIGURATION
 # Configure SECRET_KEY (essential for sessions and security)
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-key-change-in-production")
+app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", sessions.DEV_SECRET_KEY)
 
 # Configure database with better error handling
 database_url = os.environ.get("DATABASE_URL")
@@ -35,6 +52,9 @@ else:
     app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(basedir, 'finance.db')}"
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["HISTORY_PAGE_SIZE"] = int(os.environ.get("HISTORY_PAGE_SIZE", 50))
+app.config["LEADERBOARD_PAGE_SIZE"] = int(os.environ.get("LEADERBOARD_PAGE_SIZE", 50))
+app.config["SSE_MAX_SECONDS"] = int(os.environ.get("SSE_MAX_SECONDS", 300))
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
     "pool_recycle": 300,
@@ -43,42 +63,39 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize database and migrations
 db.init_app(app)
 migrate = Migrate(app, db)
+commands.init_app(app)
+app.register_blueprint(api.bp)
+price_feed.init_app(app)
+metrics.init_app(app)
+# Cache-Control per response, fingerprinted static URLs, ETags and gzip (see http_cache.py)
+http_cache.init_app(app)
 
 # Custom filter
 app.jinja_env.filters["usd"] = usd
 
-# Configure session to use filesystem (instead of signed cookies)
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
+# Compiled templates are kept on disk (JINJA_CACHE_DIR, default: a dir under /tmp), so a
+# restarted or newly forked worker loads them instead of parsing every template again
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(os.environ.get("JINJA_CACHE_DIR") or None)
 
-# Function to create tables in production
+# Configure sessions (SESSION_BACKEND: sqlalchemy, cookie or filesystem)
+sessions.configure(app, db)
+
+# Function to create tables for local runs (gunicorn migrates once in gunicorn.conf.py instead)
 def create_tables():
     """Create database tables using migrations or direct creation"""
-    with app.app_context():
-        try:
-            # First, try migrations
-            upgrade()
-            app.logger.info("✅ Database migrations applied successfully!")
-        except Exception as e:
-            app.logger.warning(f"⚠️  Migration failed: {e}")
-            app.logger.info("🔄 Trying direct table creation...")
+    try:
+        # First, try migrations
+        upgrade_database(app)
+    except Exception as e:
+        app.logger.warning(f"⚠️  Migration failed: {e}")
+        app.logger.info("🔄 Trying direct table creation...")
+        with app.app_context():
             try:
                 # Fallback: create tables directly
                 db.create_all()
                 app.logger.info("✅ Database tables created directly!")
             except Exception as e2:
                 app.logger.error(f"❌ Table creation failed: {e2}")
-                if os.environ.get("DATABASE_URL"):
-                    app.logger.error("❌ Database setup failed in production. This will cause issues.")
-
-@app.after_request
-def after_request(response):
-    """Ensure responses aren't cached"""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
-    return response
 
 @app.route("/")
 @login_required
@@ -90,40 +107,75 @@ def index():
             session.clear()
             return redirect("/login")
 
-        buys = Buy.query.filter_by(user_id=user.id).all()
-        stocks = {}
-
-        for buy in buys:
-            if buy.symbol in stocks:
-                stocks[buy.symbol]['shares'] += buy.shares
-            else:
-                try:
-                    price_info = lookup(buy.symbol)
-                    if price_info and 'price' in price_info:
-                        current_price = price_info['price']
-                    else:
-                        current_price = float(buy.price)
-                except Exception:
-                    current_price = float(buy.price)
-
-                stocks[buy.symbol] = {
-                    'symbol': buy.symbol,
-                    'shares': buy.shares,
-                    'price': current_price
-                }
+        holdings = Position.holdings(user.id)
+        prices = price_holdings(user.id, holdings)
+        stocks = [{'symbol': symbol, 'shares': shares, 'price': prices[symbol]}
+                  for symbol, shares in holdings.items()]
 
         cash = user.cash
-        stocks_under_or_zero = [stock for stock in stocks.values() if stock['shares'] > 0]
-        total_value = sum(stock['shares'] * stock['price'] for stock in stocks_under_or_zero)
+        total_value = sum(stock['shares'] * stock['price'] for stock in stocks)
         total_value += cash
         current_time = datetime.now().hour
 
-        return render_template("index.html", user=user, stocks=stocks_under_or_zero,
+        # Re-rendered only after a trade or when one of the prices moves (see fragments.py)
+        holdings_rows = fragment_cache.render(
+            ("holdings", user.id, user.ledger_version, price_version(prices)),
+            "holdings_rows.html", stocks=stocks)
+
+        return render_template("index.html", user=user, stocks=stocks, holdings_rows=holdings_rows,
                              cash=cash, total_value=total_value, current_time=current_time)
     except Exception as e:
         app.logger.error(f"Error in index route: {e}")
         return apology("An error occurred loading the portfolio")
 
+@app.route("/stream/portfolio")
+@login_required
+def stream_portfolio():
+    """Server-Sent Events: push price and total value changes for the user's holdings"""
+    user = User.query.get(session["user_id"])
+    if not user:
+        return apology("user not found", 400)
+
+    # Every stream holds a worker thread, past SSE_MAX_STREAMS the page polls the API instead
+    if not price_feed.claim_stream():
+        metrics.registry.inc("sse_streams_refused_total")
+        return Response("retry: 30000\n\n", status=503, mimetype="text/event-stream",
+                        headers={"Retry-After": "30", "Cache-Control": NO_STORE})
+
+    try:
+        holdings = Position.holdings(user.id)
+        cash = user.cash
+        prices = price_holdings(user.id, holdings)
+    except Exception:
+        price_feed.release_stream()
+        raise
+    max_seconds = app.config["SSE_MAX_SECONDS"]
+
+    def generate():
+        subscription = price_feed.subscribe(holdings)
+        try:
+            yield "retry: 5000\n\n"
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                changed = subscription.wait(timeout=min(15, max(deadline - time.monotonic(), 0)))
+                changed = {symbol: price for symbol, price in changed.items()
+                           if prices.get(symbol) != price}
+                if not changed:
+                    yield ": keep-alive\n\n"
+                    continue
+                prices.update(changed)
+                total = cash + sum(shares * prices[symbol] for symbol, shares in holdings.items())
+                yield f"data: {json.dumps({'prices': changed, 'total': round(total, 2)})}\n\n"
+        finally:
+            price_feed.unsubscribe(subscription)
+
+    # Streams end after SSE_MAX_SECONDS so workers get recycled, EventSource reconnects on its own
+    response = Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # On close rather than in generate(): a client gone before the first chunk never runs it
+    response.call_on_close(price_feed.release_stream)
+    return response
+
 @app.route("/buy", methods=["GET", "POST"])
 @login_required
 def buy():
@@ -143,6 +195,8 @@ def buy():
     stock_data = lookup(stock)
     if not stock_data or "error" in stock_data or "price" not in stock_data:
         return apology("Invalid stock symbol or quote not found", 400, "/buy", 3)
+    if stock_data.get("stale"):
+        return apology("Quotes are delayed right now, try again shortly", 503, "/buy", 3)
 
     try:
         shares = int(shares)
@@ -161,19 +215,14 @@ def buy():
         return apology("Insufficient funds", 400, "/", 3)
 
     try:
-        user.cash -= total_price
-        purchase = Buy(
-            user_id=user.id,
-            symbol=stock.upper(),
-            shares=shares,
-            price=price
-        )
-        db.session.add(purchase)
-        db.session.commit()
+        # The ledger re-checks cash inside the UPDATE itself, the check above is just a fast path
+        record_buy(user.id, stock, shares, price)
 
         flash(f"Successfully bought {shares} shares of {stock.upper()} at ${price:.2f} each.")
         return redirect("/")
 
+    except InsufficientFunds:
+        return apology("Insufficient funds", 400, "/", 3)
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error during purchase: {e}")
@@ -182,11 +231,75 @@ def buy():
 @app.route("/history")
 @login_required
 def history():
-    """Show history of transactions"""
-    transactions = Buy.query.filter_by(user_id=session["user_id"]).order_by(Buy.timestamp.desc()).all()
-    return render_template("history.html", transactions=transactions)
+    """Show history of transactions, one keyset page at a time"""
+    user_id = session["user_id"]
+    before = decode_cursor(request.args.get("before"))
+    after = decode_cursor(request.args.get("after"))
+    page_size = app.config["HISTORY_PAGE_SIZE"]
+
+    # A page only changes when the ledger does, so a cached one skips the history query too
+    version = db.session.query(User.ledger_version).filter_by(id=user_id).scalar()
+    key = ("history", user_id, version, before, after, page_size)
+    table = fragment_cache.get(key)
+    if table is None:
+        transactions, has_older, has_newer = Buy.history_page(user_id, page_size, before=before, after=after)
+
+        older_cursor = newer_cursor = None
+        if transactions:
+            if has_older:
+                older_cursor = encode_cursor(transactions[-1].timestamp, transactions[-1].id)
+            if has_newer:
+                newer_cursor = encode_cursor(transactions[0].timestamp, transactions[0].id)
+
+        table = Markup(render_template("history_table.html", transactions=transactions,
+                                       older_cursor=older_cursor, newer_cursor=newer_cursor))
+        fragment_cache.set(key, table)
+
+    return render_template("history.html", table=table)
+
+@app.route("/leaderboard")
+@login_required
+def leaderboard():
+    """Competition standings from the last leaderboard job run, one page of ranks at a time"""
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    per_page = app.config["LEADERBOARD_PAGE_SIZE"]
+
+    rows = LeaderboardEntry.page(page, per_page)
+    total = LeaderboardEntry.total()
+    me = db.session.get(LeaderboardEntry, session["user_id"])
+    return render_template("leaderboard.html", rows=rows, me=me, total=total, page=page,
+                           has_next=page * per_page < total)
+
+@app.route("/history.csv")
+@login_required
+def history_csv():
+    """Stream the whole transaction history as CSV without holding it in memory"""
+    user_id = session["user_id"]
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["symbol", "shares", "price", "transacted"])
+        rows = (db.session.query(Buy.symbol, Buy.shares, Buy.price, Buy.timestamp)
+                .filter(Buy.user_id == user_id)
+                .order_by(Buy.timestamp.desc(), Buy.id.desc())
+                .yield_per(1000))
+        for count, (symbol, shares, price, timestamp) in enumerate(rows, 1):
+            writer.writerow([symbol, shares, f"{float(price):.2f}", timestamp.isoformat()])
+            if count % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=history.csv"})
 
 @app.route("/login", methods=["GET", "POST"])
+@cache_policy(NO_STORE)
 def login():
     """Log user in"""
     session.clear()
@@ -230,6 +343,7 @@ def quote():
     return render_template("quoted.html", quote=quote_data)
 
 @app.route("/register", methods=["GET", "POST"])
+@cache_policy(NO_STORE)
 def register():
     """Register user"""
     if request.method == "POST":
@@ -278,15 +392,7 @@ def sell():
         return apology("user not found", 400)
 
     if request.method == "GET":
-        owned_shares = Buy.query.filter_by(user_id=user.id).all()
-        holdings = {}
-        for share in owned_shares:
-            symbol = share.symbol
-            if symbol in holdings:
-                holdings[symbol] += share.shares
-            else:
-                holdings[symbol] = share.shares
-        holdings = {symbol: shares for symbol, shares in holdings.items() if shares > 0}
+        holdings = Position.holdings(user.id)
         return render_template("sell.html", holdings=holdings)
 
     stock = request.form.get("symbol")
@@ -305,30 +411,25 @@ def sell():
         return apology("shares number invalid, try again", 400, "/sell", 3)
 
     stock_info = lookup(stock.upper())
-    if not stock_info:
+    if not stock_info or "price" not in stock_info:
         return apology("stock not found", 404, "/sell", 3)
+    if stock_info.get("stale"):
+        return apology("Quotes are delayed right now, try again shortly", 503, "/sell", 3)
 
     current_price = float(stock_info["price"])
-    transactions = Buy.query.filter_by(user_id=user.id, symbol=stock.upper()).all()
-    owned_shares = sum(transaction.shares for transaction in transactions)
+    owned_shares = Position.shares_owned(user.id, stock.upper())
 
     if shares > owned_shares:
         return apology("not enough shares", 400, "/sell", 3)
 
     try:
-        purchase = Buy(
-            user_id=user.id,
-            symbol=stock.upper(),
-            shares=-shares,
-            price=current_price
-        )
-        user.cash += shares * current_price
-        db.session.add(purchase)
-        db.session.commit()
+        record_sell(user.id, stock, shares, current_price)
 
         flash(f"Successfully sold {shares} shares of {stock.upper()} at ${current_price:.2f} each.")
         return redirect("/")
 
+    except InsufficientShares:
+        return apology("not enough shares", 400, "/sell", 3)
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error during sale: {e}")
@@ -336,6 +437,7 @@ def sell():
 
 @app.route("/password", methods=["GET", "POST"])
 @login_required
+@cache_policy(NO_STORE)
 def password():
     """Change user's password."""
     if request.method == "POST":
@@ -411,7 +513,10 @@ def health():
     """Health check for deployment platforms"""
     try:
         db.session.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected"}, 200
+        return {"status": "healthy", "database": "connected", "quote_cache": quote_cache.stats(),
+                "quote_flights": quote_flights.stats(), "quote_providers": quote_providers.stats(),
+                "fragment_cache": fragment_cache.stats(), "symbol_index": symbol_index.stats(),
+                "price_feed": price_feed.stats()}, 200
     except Exception as e:
         return {"status": "unhealthy", "database_error": str(e)}, 500
 
@@ -419,8 +524,5 @@ if __name__ == '__main__':
     create_tables()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
-else:
-    # This runs when Gunicorn imports the app
-    if os.environ.get("DATABASE_URL"):
-        app.logger.info("🚀 Production mode detected, setting up database...")
-        create_tables()
+# Under gunicorn, nothing happens at import: migrations run once in the master
+# (gunicorn.conf.py) or in the release step (`flask setup-db`), never per worker.
@@ -0,0 +1,122 @@
+"""
+Analytics engine benchmark on a synthetic ledger (1M transactions by default).
+
+Builds a realistic, never-oversold ledger across a few hundred symbols, times
+analytics.analyze() on it and checks the results against a plain trade-by-trade
+Python implementation (on a slice, the loop is slow, that's the point).
+
+    python bench/analytics_1m.py --rows 1000000 --check-rows 50000
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+
+from analytics import analyze
+
+
+def synthetic_ledger(rows, n_symbols, seed):
+    rng = np.random.default_rng(seed)
+    symbols = np.array([f"S{i:03d}" for i in range(n_symbols)])
+    codes = rng.integers(0, n_symbols, rows)
+    sizes = rng.integers(1, 100, rows)
+    wants_sell = rng.random(rows) < 0.4
+    drift = rng.normal(0, 0.01, rows)
+
+    held = np.zeros(n_symbols, dtype=np.int64)
+    last = rng.uniform(10, 500, n_symbols)
+    qty = np.empty(rows, dtype=np.int64)
+    price = np.empty(rows)
+    for i in range(rows):
+        code = codes[i]
+        last[code] *= 1 + drift[i]
+        price[i] = round(last[code], 2)
+        if wants_sell[i] and held[code] > 0:
+            qty[i] = -min(sizes[i], held[code])
+        else:
+            qty[i] = sizes[i]
+        held[code] += qty[i]
+
+    timestamps = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.arange(rows), unit="s")
+    return pd.DataFrame({"symbol": symbols[codes], "shares": qty, "price": price,
+                         "timestamp": timestamps})
+
+
+def reference(ledger, prices):
+    """The obvious per-row implementation, used to check the vectorized one"""
+    lots, avg = {}, {}
+    realized_fifo, realized_avg = {}, {}
+    for symbol, shares, price in zip(ledger["symbol"], ledger["shares"], ledger["price"]):
+        lots.setdefault(symbol, deque())
+        held, basis = avg.get(symbol, (0, 0.0))
+        if shares > 0:
+            lots[symbol].append([shares, price])
+            avg[symbol] = (held + shares, basis + shares * price)
+            continue
+        to_sell, cost = -shares, 0.0
+        while to_sell:
+            lot = lots[symbol][0]
+            take = min(to_sell, lot[0])
+            cost += take * lot[1]
+            lot[0] -= take
+            to_sell -= take
+            if lot[0] == 0:
+                lots[symbol].popleft()
+        realized_fifo[symbol] = realized_fifo.get(symbol, 0.0) + -shares * price - cost
+        sold_basis = basis * -shares / held
+        realized_avg[symbol] = realized_avg.get(symbol, 0.0) + -shares * price - sold_basis
+        avg[symbol] = (held + shares, basis - sold_basis if held + shares else 0.0)
+
+    return {symbol: {
+        "fifo_cost": sum(q * p for q, p in lots[symbol]),
+        "average_cost": avg[symbol][1],
+        "realized_fifo": realized_fifo.get(symbol, 0.0),
+        "realized_average": realized_avg.get(symbol, 0.0),
+    } for symbol in lots}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--check-rows", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} transactions over {args.symbols} symbols...")
+    ledger = synthetic_ledger(args.rows, args.symbols, args.seed)
+    prices = ledger.groupby("symbol")["price"].last().mul(1.05).to_dict()
+
+    runs = []
+    for _ in range(3):
+        started = time.perf_counter()
+        result = analyze(ledger, prices)
+        runs.append(time.perf_counter() - started)
+    print(f"analyze(): best of 3 {min(runs) * 1000:.0f} ms "
+          f"({args.rows / min(runs) / 1e6:.1f}M transactions/s), "
+          f"TWR {result['time_weighted_return']:.2%}")
+
+    sample = ledger.head(args.check_rows)
+    started = time.perf_counter()
+    expected = reference(sample, prices)
+    loop_time = time.perf_counter() - started
+    got = analyze(sample, prices)["symbols"]
+    # Relative, because running sums over a long history reassociate floating point math
+    worst = max(abs(got[s][k] - v) / max(abs(v), 1.0)
+                for s, row in expected.items() for k, v in row.items())
+    print(f"reference loop on {len(sample):,} rows: {loop_time * 1000:.0f} ms "
+          f"(~{loop_time * len(ledger) / len(sample) * 1000:.0f} ms at {len(ledger):,}), "
+          f"max relative difference {worst:.2e}")
+    if worst > 1e-6:
+        sys.exit("❌ vectorized results disagree with the reference implementation")
+    print("✅ vectorized results match the reference implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Gunicorn boot time: how long until workers can serve, with and without preloading.
+
+Starts gunicorn with gunicorn.conf.py against a fresh SQLite database, waits for
+/health to answer and reads each worker's "ready N ms after fork" log line. Runs
+once with preload_app (the default config: migrate once in the master, fork workers
+that already have the app imported) and once with GUNICORN_PRELOAD=0 (migrations
+run in a `flask setup-db` subprocess, the master never imports the app and every
+worker imports it itself, which is what a cold worker costs).
+
+    python bench/boot_time.py --workers 4
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+READY = re.compile(r"Worker (\d+) ready (\d+) ms after fork")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def boot(workers, preload, timeout=60):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/boot.db")
+    if not preload:
+        env.update(GUNICORN_PRELOAD="0")
+    command = [sys.executable, "-m", "gunicorn", "app:app", "--log-level", "info"]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True)
+    first_response = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        first_response = time.perf_counter() - started
+                        break
+            except OSError:
+                time.sleep(0.02)
+        time.sleep(0.5)  # let the remaining workers finish booting
+    finally:
+        server.terminate()
+        log = server.communicate(timeout=10)[1]
+
+    ready = [int(ms) for _, ms in READY.findall(log)]
+    if first_response is None or len(ready) < workers:
+        sys.exit(f"❌ gunicorn didn't come up:\n{log[-2000:]}")
+    return first_response, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for preload in (True, False):
+        firsts, readies = [], []
+        for _ in range(args.runs):
+            first, ready = boot(args.workers, preload)
+            firsts.append(first)
+            readies.extend(ready)
+        label = "preload (default)" if preload else "cold workers"
+        print(f"{label:<18} first /health after {statistics.median(firsts) * 1000:6.0f} ms, "
+              f"worker ready after fork: median {statistics.median(readies):4.0f} ms, "
+              f"max {max(readies):4.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
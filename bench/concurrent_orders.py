@@ -0,0 +1,128 @@
+"""
+Concurrency stress test for the ledger.
+
+Fires buys and sells for a handful of accounts from many threads at once, then checks
+that nobody overdrafted or oversold and that cash and positions still agree with the
+transactions ledger.
+
+    python bench/concurrent_orders.py --threads 16 --orders 300
+    DATABASE_URL=postgresql://... python bench/concurrent_orders.py
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/stress.db"
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from app import app
+from commands import replay_ledger
+from database import db
+from ledger import LedgerError, record_buy, record_sell
+from models import Buy, Position, User
+from startup import upgrade_database
+
+PRICES = {"AAPL": 187.5, "MSFT": 402.25, "NVDA": 95.1}
+STARTING_CASH = 10000.0
+counts_lock = threading.Lock()
+
+
+def tally(counts, key):
+    with counts_lock:
+        counts[key] += 1
+
+
+def worker(user_ids, orders, seed, counts):
+    rng = random.Random(seed)
+    with app.app_context():
+        for _ in range(orders):
+            user_id = rng.choice(user_ids)
+            symbol = rng.choice(list(PRICES))
+            shares = rng.randint(1, 15)
+            trade = record_buy if rng.random() < 0.55 else record_sell
+            try:
+                trade(user_id, symbol, shares, PRICES[symbol])
+                tally(counts, "filled")
+            except LedgerError:
+                tally(counts, "rejected")
+            except OperationalError:
+                # SQLite "database is locked" under heavy contention, not a correctness issue
+                db.session.rollback()
+                tally(counts, "busy")
+        db.session.remove()
+
+
+def check(user_ids):
+    problems = []
+    spent = dict(db.session.query(Buy.user_id, func.sum(Buy.shares * Buy.price))
+                 .group_by(Buy.user_id).all())
+    for user in User.query.filter(User.id.in_(user_ids)):
+        if user.cash < -0.005:
+            problems.append(f"user {user.id} overdrafted: cash {user.cash:.2f}")
+        expected = STARTING_CASH - float(spent.get(user.id) or 0)
+        if abs(expected - user.cash) > 0.01:
+            problems.append(f"user {user.id} cash {user.cash:.2f} but ledger says {expected:.2f}")
+
+    for position in Position.query.filter(Position.user_id.in_(user_ids)):
+        if position.shares < 0:
+            problems.append(f"user {position.user_id} oversold {position.symbol}: {position.shares}")
+
+    expected_positions = replay_ledger()
+    for position in Position.query.filter(Position.user_id.in_(user_ids)):
+        held, _ = expected_positions.get((position.user_id, position.symbol), (0, 0.0))
+        if held != position.shares:
+            problems.append(f"user {position.user_id} {position.symbol}: "
+                            f"positions {position.shares}, ledger {held}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=300, help="orders per thread")
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    upgrade_database(app)
+    with app.app_context():
+        stamp = int(time.time() * 1000)
+        users = [User(username=f"stress-{stamp}-{i}", hash="x", cash=STARTING_CASH)
+                 for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+
+    counts = {"filled": 0, "rejected": 0, "busy": 0}
+    threads = [threading.Thread(target=worker, args=(user_ids, args.orders, args.seed + i, counts))
+               for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = args.threads * args.orders
+    print(f"{total} orders in {elapsed:.2f}s ({total / elapsed:.0f}/s): "
+          f"{counts['filled']} filled, {counts['rejected']} rejected, {counts['busy']} busy")
+
+    with app.app_context():
+        problems = check(user_ids)
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        sys.exit(1)
+    print("✅ no overdrafts, no oversells, cash and positions match the ledger")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Local stand-in for the Finnhub endpoints the app uses (/quote and /stock/profile2).
+
+Answers after a configurable latency (plus a slow tail: --slow-rate of calls take
+--slow-latency), fails a configurable fraction of calls with
+503 (and another fraction with 429 + Retry-After) and counts every call, so a
+benchmark can report upstream calls per request. Prices random-walk a little on every
+call so quote caching is visible.
+
+    python bench/finnhub_stub.py --port 9100 --latency 0.08 --jitter 0.04 --error-rate 0.02
+    FINNHUB_BASE_URL=http://127.0.0.1:9100 FINNHUB_API_KEY=stub python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubState:
+    """Knobs and counters shared by every handler thread."""
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, throttle_rate=0.0, seed=None,
+                 slow_rate=0.0, slow_latency=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.prices = {}
+        self.calls = {"quote": 0, "profile": 0, "errors": 0, "throttled": 0}
+        self.lock = threading.Lock()
+
+    def total_calls(self):
+        with self.lock:
+            return self.calls["quote"] + self.calls["profile"]
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.calls)
+
+    def reset(self):
+        with self.lock:
+            for key in self.calls:
+                self.calls[key] = 0
+
+    def price(self, symbol):
+        with self.lock:
+            price = self.prices.get(symbol) or self.rng.uniform(20, 400)
+            price = round(price * (1 + self.rng.gauss(0, 0.002)), 2)
+            self.prices[symbol] = price
+            return price
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by start()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.state
+        url = urlparse(self.path)
+        symbol = parse_qs(url.query).get("symbol", [""])[0].upper()
+        endpoint = "profile" if url.path.endswith("/stock/profile2") else "quote"
+
+        with state.lock:
+            state.calls[endpoint] += 1
+            roll = state.rng.random()
+            delay = max(state.latency + state.rng.uniform(-state.jitter, state.jitter), 0)
+            if state.rng.random() < state.slow_rate:
+                delay = state.slow_latency
+        time.sleep(delay)
+
+        if roll < state.error_rate:
+            with state.lock:
+                state.calls["errors"] += 1
+            return self._send(503, {"error": "stub outage"})
+        if roll < state.error_rate + state.throttle_rate:
+            with state.lock:
+                state.calls["throttled"] += 1
+            return self._send(429, {"error": "API limit reached"}, {"Retry-After": "0.1"})
+
+        if not symbol.isalnum():
+            return self._send(200, {} if endpoint == "profile" else {"c": 0})
+        if endpoint == "profile":
+            return self._send(200, {"name": f"{symbol} Inc.", "exchange": "NASDAQ", "currency": "USD"})
+        price = state.price(symbol)
+        return self._send(200, {"c": price, "pc": price, "t": int(time.time())})
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(port=0, **knobs):
+    """Serve the stub on a background thread, returns (server, state, base_url)."""
+    state = StubState(**knobs)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="finnhub-stub", daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="+- seconds around --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction answered after --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server, state, url = start(args.port, latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                               slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"🧪 Finnhub stub on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"calls so far: {state.snapshot()}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Leaderboard at scale: one valuation pass, incremental rewrites and O(log n) reads.
+
+Seeds --users users holding --positions symbols each (transactions and positions), then
+times:
+
+- naive: what a page view would cost without the job, summing every user's holdings
+  out of transactions and ranking them all
+- the job's first pass (every row inserted) and a second pass after a few prices moved
+  (only changed rows written)
+- a user's rank and a page of the top N, read from the snapshot table
+
+Prices are passed in, so no quote traffic is involved.
+
+    python bench/leaderboard.py --users 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/leaderboard.db"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from leaderboard import job  # noqa: E402
+from models import Buy, LeaderboardEntry, Position, User  # noqa: E402
+from startup import upgrade_database  # noqa: E402
+
+
+def seed(users, positions, symbols, rng):
+    user_rows, buy_rows, position_rows = [], [], []
+    for user_id in range(1, users + 1):
+        user_rows.append({"id": user_id, "username": f"trader{user_id}", "hash": "x",
+                          "cash": round(rng.uniform(0, 10000), 2)})
+        for symbol in rng.sample(symbols, positions):
+            shares = rng.randint(1, 100)
+            price = round(rng.uniform(10, 500), 2)
+            buy_rows.append({"user_id": user_id, "symbol": symbol, "shares": shares, "price": price})
+            position_rows.append({"user_id": user_id, "symbol": symbol, "shares": shares,
+                                  "cost_basis": shares * price})
+    for model, rows in ((User, user_rows), (Buy, buy_rows), (Position, position_rows)):
+        for start in range(0, len(rows), 50000):
+            db.session.execute(insert(model), rows[start:start + 50000])
+    db.session.commit()
+
+
+def naive(prices):
+    """Rank everyone straight from the transactions table."""
+    held = db.session.execute(select(Buy.user_id, Buy.symbol, func.sum(Buy.shares))
+                              .group_by(Buy.user_id, Buy.symbol)).all()
+    values = dict(db.session.execute(select(User.id, User.cash)).all())
+    for user_id, symbol, shares in held:
+        values[user_id] += shares * prices[symbol]
+    return sorted(values.items(), key=lambda item: -item[1])
+
+
+def timed(fn, *args, repeat=1):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        runs.append(time.perf_counter() - started)
+    return result, statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--positions", type=int, default=5, help="symbols held per user")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    symbols = [f"S{i:03d}" for i in range(args.symbols)]
+    prices = {symbol: round(rng.uniform(10, 500), 2) for symbol in symbols}
+
+    upgrade_database(app)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users, args.positions, symbols, rng)
+        print(f"seeded {args.users:,} users, {args.users * args.positions:,} positions "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        _, seconds = timed(naive, prices)
+        print(f"naive ranking from transactions   {seconds * 1000:8.0f} ms  (per page view)")
+
+        job.init_app(app)
+        (written, _), seconds = timed(job.refresh, prices)
+        print(f"job, first pass                   {seconds * 1000:8.0f} ms  ({written:,} rows written)")
+
+        for symbol in rng.sample(symbols, 5):
+            prices[symbol] = round(prices[symbol] * rng.uniform(0.98, 1.02), 2)
+        (written, _), seconds = timed(job.refresh, prices)
+        print(f"job, 5 of {args.symbols} prices moved       {seconds * 1000:8.0f} ms  ({written:,} rows written)")
+        (written, _), seconds = timed(job.refresh, prices)
+        print(f"job, nothing moved                {seconds * 1000:8.0f} ms  ({written:,} rows written)")
+
+        user_ids = [rng.randint(1, args.users) for _ in range(200)]
+        _, seconds = timed(lambda: [db.session.get(LeaderboardEntry, user_id) for user_id in user_ids])
+        print(f"rank lookup                       {seconds / len(user_ids) * 1e6:8.0f} µs")
+        middle = args.users // 100
+        _, seconds = timed(LeaderboardEntry.page, 1, 50, repeat=20)
+        print(f"top 50                            {seconds * 1e6:8.0f} µs")
+        _, seconds = timed(LeaderboardEntry.page, middle, 50, repeat=20)
+        print(f"page {middle} of 50                     {seconds * 1e6:8.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
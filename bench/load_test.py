@@ -0,0 +1,385 @@
+"""
+End-to-end load test of the real app against a local Finnhub stand-in.
+
+Starts bench/finnhub_stub.py in-process (latency and error rates are flags), seeds
+users and transactions at realistic volumes, logs one test client in per thread and
+drives /, /quote, /history, /buy and /sell concurrently. Each route gets its own
+phase, so SQL statements and upstream calls per request are exact, and a final
+mixed phase measures overall throughput.
+
+    python bench/load_test.py --users 200 --trades 500 --threads 16 --requests 100
+    python bench/load_test.py --output bench/results/main.json
+    python bench/load_test.py --baseline bench/results/main.json --max-regression 0.2
+    python bench/load_test.py --providers replay    # quotes from a generated replay file, no stub traffic
+    DATABASE_URL=postgresql://... python bench/load_test.py
+
+Results (per phase: throughput, p50/p95/p99 latency, errors, SQL and upstream calls
+per request) are printed and optionally written as JSON. With --baseline, the run is
+compared to a previous JSON file and exits non-zero when p95 latency or throughput
+got worse by more than --max-regression.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import finnhub_stub
+
+PASSWORD = "bench-password"
+STARTING_CASH = 1_000_000.0
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "AVGO", "JPM", "V",
+           "WMT", "XOM", "UNH", "MA", "PG", "JNJ", "HD", "COST", "ORCL", "NFLX",
+           "AMD", "KO", "PEP", "BAC", "CRM", "ADBE", "INTC", "DIS", "CSCO", "NKE"]
+MIX = {"index": 40, "quote": 20, "history": 20, "buy": 10, "sell": 10}
+
+
+# --- Seeding ---
+
+def write_replay(directory, rng, steps=60):
+    """A replay file with a short random walk per symbol, for --providers replay."""
+    path = os.path.join(directory, "quotes_replay.csv")
+    with open(path, "w") as f:
+        f.write("symbol,price,name\n")
+        for symbol in SYMBOLS:
+            price = rng.uniform(20, 400)
+            for _ in range(steps):
+                price *= 1 + rng.gauss(0, 0.002)
+                f.write(f"{symbol},{price:.2f},{symbol} Inc.\n")
+    return path
+
+
+def seed(app, users, trades, rng):
+    """Bulk-insert users, their transactions, positions and symbol profiles (skipped if present)."""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from database import db
+    from models import Buy, Position, Symbol, User, apply_trade
+
+    with app.app_context():
+        existing = User.query.filter(User.username.like("bench-%")).count()
+        if existing >= users:
+            print(f"♻️  Reusing {existing} seeded users")
+            return
+        started = time.perf_counter()
+        password_hash = generate_password_hash(PASSWORD)  # same hash for everyone, hashing is slow
+        db.session.execute(insert(User), [
+            {"username": f"bench-{i}", "hash": password_hash, "cash": STARTING_CASH}
+            for i in range(existing, users)])
+        ids = [user.id for user in User.query.filter(User.username.like("bench-%"))
+               .order_by(User.id).offset(existing)]
+
+        now = datetime.now(timezone.utc)
+        base = {symbol: rng.uniform(20, 400) for symbol in SYMBOLS}
+        rows, positions, cash = [], [], []
+        for user_id in ids:
+            held, spent = {}, 0.0
+            when = now - timedelta(days=730)
+            step = timedelta(days=730) / max(trades, 1)
+            for _ in range(trades):
+                symbol = rng.choice(SYMBOLS)
+                shares, cost = held.get(symbol, (0, 0.0))
+                price = round(base[symbol] * rng.uniform(0.7, 1.3), 2)
+                quantity = rng.randint(1, 20)
+                if shares and rng.random() < 0.4:
+                    quantity = -min(quantity, shares)
+                held[symbol] = apply_trade(shares, cost, quantity, price)
+                spent += quantity * price
+                rows.append({"user_id": user_id, "symbol": symbol, "shares": quantity,
+                             "price": price, "timestamp": when})
+                when += step
+            cash.append({"id": user_id, "cash": STARTING_CASH - spent})
+            positions.extend({"user_id": user_id, "symbol": symbol, "shares": shares, "cost_basis": cost}
+                             for symbol, (shares, cost) in held.items())
+            if len(rows) >= 20000:
+                db.session.execute(insert(Buy), rows)
+                rows = []
+        if rows:
+            db.session.execute(insert(Buy), rows)
+        db.session.execute(insert(Position), positions)
+        db.session.bulk_update_mappings(User, cash)
+
+        # Profiles are cached in the symbols table in steady state, so seed them too
+        known = {symbol for (symbol,) in db.session.query(Symbol.symbol)}
+        profiles = [{"symbol": symbol, "name": f"{symbol} Inc.", "exchange": "NASDAQ",
+                     "currency": "USD", "updated_at": now} for symbol in SYMBOLS if symbol not in known]
+        if profiles:
+            db.session.execute(insert(Symbol), profiles)
+        db.session.commit()
+        print(f"🌱 Seeded {len(ids)} users / {len(ids) * trades:,} transactions "
+              f"in {time.perf_counter() - started:.1f}s")
+
+
+# --- Scenarios, each returns the response ---
+
+def scenario_index(client, rng, user):
+    return client.get("/")
+
+
+def scenario_quote(client, rng, user):
+    return client.post("/quote", data={"symbol": rng.choice(SYMBOLS)})
+
+
+def scenario_history(client, rng, user):
+    return client.get("/history")
+
+
+def scenario_buy(client, rng, user):
+    symbol = rng.choice(SYMBOLS)
+    response = client.post("/buy", data={"symbol": symbol, "shares": str(rng.randint(1, 5))})
+    if response.status_code < 400:
+        user["held"][symbol] = user["held"].get(symbol, 0) + 1
+    return response
+
+
+def scenario_sell(client, rng, user):
+    held = [symbol for symbol, shares in user["held"].items() if shares > 0]
+    if not held:
+        return scenario_buy(client, rng, user)
+    symbol = rng.choice(held)
+    user["held"][symbol] -= 1
+    return client.post("/sell", data={"symbol": symbol, "shares": "1"})
+
+
+SCENARIOS = {"index": scenario_index, "quote": scenario_quote, "history": scenario_history,
+             "buy": scenario_buy, "sell": scenario_sell}
+
+
+# --- Driver ---
+
+class SQLCounter:
+    """Counts statements sent to the database by anyone (request threads and lookup pool)."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            count, self.count = self.count, 0
+            return count
+
+
+def log_in(app, users, threads):
+    """One logged-in test client per thread, plus what that user holds."""
+    from models import Position, User
+
+    clients = []
+    with app.app_context():
+        bench_users = (User.query.filter(User.username.like("bench-%"))
+                       .order_by(User.id).limit(threads).all())
+        if len(bench_users) < threads:
+            sys.exit(f"❌ need at least {threads} seeded users (--users)")
+        for user in bench_users:
+            client = app.test_client()
+            response = client.post("/login", data={"username": user.username, "password": PASSWORD})
+            if response.status_code != 302:
+                sys.exit(f"❌ could not log in as {user.username}")
+            clients.append((client, {"id": user.id, "held": Position.holdings(user.id)}))
+    return clients
+
+
+def run_phase(name, weights, clients, requests, seed, sql, stub):
+    names, cumulative = list(weights), list(weights.values())
+    results = [[] for _ in clients]
+
+    def drive(index):
+        client, user = clients[index]
+        rng = random.Random(seed + index)
+        for _ in range(requests):
+            scenario = rng.choices(names, cumulative)[0]
+            started = time.perf_counter()
+            try:
+                status = SCENARIOS[scenario](client, rng, user).status_code
+            except Exception:
+                status = 599
+            results[index].append((scenario, time.perf_counter() - started, status))
+
+    settle(stub)
+    sql.take()
+    stub.reset()
+    threads = [threading.Thread(target=drive, args=(i,)) for i in range(len(clients))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for thread_results in results for sample in thread_results]
+    latencies = sorted(latency for _, latency, _ in samples)
+    calls = stub.snapshot()
+    return {
+        "requests": len(samples),
+        "errors": sum(status >= 400 for _, _, status in samples),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "sql_per_request": round(sql.take() / len(samples), 2),
+        "upstream_per_request": round((calls["quote"] + calls["profile"]) / len(samples), 3),
+        "upstream_errors": calls["errors"] + calls["throttled"],
+    }
+
+
+def settle(stub, quiet=0.3, timeout=10):
+    """Wait for upstream calls left over from the last phase (slow lookups run past their deadline)."""
+    deadline = time.monotonic() + timeout
+    calls = stub.total_calls()
+    while time.monotonic() < deadline:
+        time.sleep(quiet)
+        now = stub.total_calls()
+        if now == calls:
+            return
+        calls = now
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+# --- Reporting ---
+
+def print_results(phases, baseline=None):
+    print(f"\n{'phase':<9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'errors':>8}{'SQL/req':>9}{'API/req':>9}")
+    for name, r in phases.items():
+        print(f"{name:<9}{r['throughput_rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+              f"{r['p99_ms']:>9.1f}{r['errors']:>8}{r['sql_per_request']:>9.2f}"
+              f"{r['upstream_per_request']:>9.3f}")
+        old = (baseline or {}).get(name)
+        if old:
+            print(f"{'  vs base':<9}{change(r['throughput_rps'], old['throughput_rps']):>9}"
+                  f"{change(r['p50_ms'], old['p50_ms']):>9}{change(r['p95_ms'], old['p95_ms']):>9}"
+                  f"{change(r['p99_ms'], old['p99_ms']):>9}{'':>8}"
+                  f"{change(r['sql_per_request'], old['sql_per_request']):>9}"
+                  f"{change(r['upstream_per_request'], old['upstream_per_request']):>9}")
+
+
+def change(new, old):
+    return f"{(new - old) / old:+.0%}" if old else "n/a"
+
+
+def regressions(phases, baseline, limit):
+    problems = []
+    for name, r in phases.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if old["p95_ms"] and r["p95_ms"] > old["p95_ms"] * (1 + limit):
+            problems.append(f"{name}: p95 {old['p95_ms']} -> {r['p95_ms']} ms")
+        if r["throughput_rps"] < old["throughput_rps"] * (1 - limit):
+            problems.append(f"{name}: throughput {old['throughput_rps']} -> {r['throughput_rps']} req/s")
+    return problems
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200, help="seeded users")
+    parser.add_argument("--trades", type=int, default=500, help="seeded transactions per user")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=100, help="requests per client per phase")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per upstream call")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub 503 fraction")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="stub 429 fraction")
+    parser.add_argument("--rate-limit", type=float, default=0,
+                        help="FINNHUB_RATE_LIMIT calls per minute (0: off, so runs compare)")
+    parser.add_argument("--providers", default="finnhub",
+                        help="QUOTE_PROVIDERS, 'replay' reads a generated price file for the bench symbols")
+    parser.add_argument("--phases", default="index,quote,history,buy,sell,mixed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare with a previous JSON results file")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed p95/throughput regression vs --baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # The stub and the environment have to exist before the app (and its Finnhub client) import
+    _, stub, stub_url = finnhub_stub.start(latency=args.latency, jitter=args.jitter,
+                                           error_rate=args.error_rate,
+                                           throttle_rate=args.throttle_rate, seed=args.seed)
+    os.environ["FINNHUB_BASE_URL"] = stub_url
+    os.environ["FINNHUB_API_KEY"] = "stub"
+    os.environ["FINNHUB_RATE_LIMIT"] = str(args.rate_limit)
+    os.environ["QUOTE_PROVIDERS"] = args.providers
+    if "replay" in args.providers:
+        os.environ["QUOTE_REPLAY_PATH"] = write_replay(tempfile.mkdtemp(), random.Random(args.seed))
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load.db"
+
+    from app import app
+    from database import db
+    from startup import upgrade_database
+
+    upgrade_database(app)
+    with app.app_context():
+        sql = SQLCounter(db.engine)
+        dialect = db.engine.dialect.name
+    seed(app, args.users, args.trades, random.Random(args.seed))
+    clients = log_in(app, args.users, args.threads)
+
+    phases = {}
+    for phase in args.phases.split(","):
+        weights = MIX if phase == "mixed" else {phase: 1}
+        print(f"🏃 {phase}...")
+        phases[phase] = run_phase(phase, weights, clients, args.requests, args.seed, sql, stub)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["phases"]
+    print_results(phases, baseline)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "database": dialect,
+                    "args": vars(args),
+                },
+                "phases": phases,
+            }, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if baseline:
+        problems = regressions(phases, baseline, args.max_regression)
+        if problems:
+            for problem in problems:
+                print(f"❌ {problem}")
+            sys.exit(1)
+        print(f"✅ within {args.max_regression:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
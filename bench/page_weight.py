@@ -0,0 +1,129 @@
+"""
+Bytes and requests per page view, first visit vs repeat visit, as a browser would see them.
+
+Logs a seeded user in with the Flask test client and loads --pages like a browser with an
+HTTP cache. It stores responses by their Cache-Control:
+- immutable ones are reused without asking
+- no-cache ones are revalidated with If-None-Match
+- no-store ones are fetched every time
+
+Each page also pulls in every same-origin <link>/<script> asset it references. Runs
+once with the default policy and once with the old "no-store on everything" headers for
+comparison.
+
+    python bench/page_weight.py --trades 200
+"""
+import argparse
+import gzip
+import os
+import random
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/weight.db"
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from models import Buy, Position, User  # noqa: E402
+from startup import upgrade_database  # noqa: E402
+
+ASSET = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+class Browser:
+    """Just enough of a browser cache to count what goes over the wire."""
+
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}
+        self.requests = 0
+        self.bytes = 0
+
+    def get(self, url):
+        cached = self.cache.get(url)
+        if cached and "immutable" in cached["cache_control"]:
+            return cached["body"]
+        headers = {"Accept-Encoding": "gzip"}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        response = self.client.get(url, headers=headers)
+        body = response.get_data()
+        response.close()
+        self.requests += 1
+        self.bytes += len(body) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+        if response.status_code == 304:
+            return cached["body"]
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        cache_control = response.headers.get("Cache-Control", "")
+        if "no-store" not in cache_control:
+            self.cache[url] = {"body": body, "etag": response.headers.get("ETag"),
+                               "cache_control": cache_control}
+        return body
+
+    def view(self, url):
+        html = self.get(url)
+        for asset in ASSET.findall(html.decode()):
+            self.get(asset.replace("&amp;", "&"))
+
+
+def old_headers(response):
+    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response.headers.pop("ETag", None)
+    return response
+
+
+def measure(pages, visits):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    browser = Browser(client)
+    results = []
+    for visit in range(visits):
+        before_requests, before_bytes = browser.requests, browser.bytes
+        for page in pages:
+            browser.view(page)
+        results.append((browser.requests - before_requests, browser.bytes - before_bytes))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", default="/history,/leaderboard,/buy,/quote")
+    parser.add_argument("--trades", type=int, default=200, help="seeded transactions (history page size)")
+    args = parser.parse_args()
+    pages = args.pages.split(",")
+
+    upgrade_database(app)
+    with app.app_context():
+        rng = random.Random(5)
+        db.session.add(User(id=1, username="reader", hash="x"))
+        db.session.execute(insert(Buy), [{"user_id": 1, "symbol": rng.choice(["AAPL", "MSFT", "NVDA"]),
+                                          "shares": rng.randint(1, 20), "price": rng.uniform(50, 500)}
+                                         for _ in range(args.trades)])
+        db.session.add(Position(user_id=1, symbol="AAPL", shares=10, cost_basis=1500))
+        db.session.commit()
+
+    new = measure(pages, 2)
+    # Simulate the old global hook: no-store on everything, no ETags, no compression
+    app.after_request_funcs[None].insert(0, old_headers)
+    compress_min = app.config["COMPRESS_MIN_SIZE"]
+    app.config["COMPRESS_MIN_SIZE"] = float("inf")
+    old = measure(pages, 2)
+    app.config["COMPRESS_MIN_SIZE"] = compress_min
+
+    print(f"{len(pages)} pages: {', '.join(pages)}")
+    print(f"{'':<30}{'requests':>10}{'bytes':>12}")
+    for label, (first, repeat) in (("no-store everywhere", old), ("per-route policy", new)):
+        print(f"{label + ', first':<30}{first[0]:>10}{first[1]:>12,}")
+        print(f"{label + ', repeat':<30}{repeat[0]:>10}{repeat[1]:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Quote bursts against the local Finnhub stub: request coalescing and the shared quota.
+
+1. Coalescing: --threads threads quote the same cold symbol at the same moment, once
+   through fetch_quote() (every caller goes upstream) and once through lookup()
+   (callers share one in-flight fetch). Reports upstream calls for each.
+2. Quota: --processes processes (standing in for gunicorn workers) hammer --symbols
+   symbols for --seconds with a 1 s quote TTL, all sharing one FINNHUB_RATE_LIMIT bucket
+   in the QUOTE_CACHE_DB file. Reports upstream calls against what the quota allows and
+   how many answers were fresh, stale or errors.
+
+    python bench/quote_burst.py --rate-limit 120 --processes 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import finnhub_stub  # noqa: E402  (bench/ is on sys.path when run as a script)
+
+
+def burst(fn, symbol, threads):
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(fn(symbol))
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return results
+
+
+def hammer(symbols, threads, seconds, queue):
+    """One 'worker process': threads looping over lookups until time is up."""
+    from helpers import lookup
+
+    outcomes = Counter()
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def worker(offset):
+        i = offset
+        while time.monotonic() < stop_at:
+            quote = lookup(symbols[i % len(symbols)])
+            outcome = "error" if "price" not in quote else "stale" if quote.get("stale") else "fresh"
+            with lock:
+                outcomes[outcome] += 1
+            i += 1
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    queue.put(dict(outcomes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=32, help="threads per burst / per process")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate-limit", type=float, default=120, help="upstream calls per minute")
+    parser.add_argument("--burst", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub seconds per call")
+    args = parser.parse_args()
+
+    _, stub, stub_url = finnhub_stub.start(latency=args.latency, jitter=0, seed=1)
+    os.environ.update(
+        FINNHUB_BASE_URL=stub_url, FINNHUB_API_KEY="stub",
+        FINNHUB_RATE_LIMIT=str(args.rate_limit), FINNHUB_RATE_BURST=str(args.burst),
+        QUOTE_CACHE_DB=os.path.join(tempfile.mkdtemp(), "quotes.db"), QUOTE_CACHE_TTL="1",
+    )
+    import finnhub
+    import helpers
+
+    # 1. coalescing, quota out of the way
+    limiter = finnhub.client.limiter
+    finnhub.client.limiter = finnhub.TokenBucket(rate=0)
+    for label, fn, symbol in (("every caller", helpers.fetch_quote, "BURSTA"),
+                              ("coalesced", helpers.lookup, "BURSTB")):
+        stub.reset()
+        results = burst(fn, symbol, args.threads)
+        ok = sum("price" in result for result in results)
+        print(f"{label:<13} {args.threads} concurrent lookups: {stub.total_calls():3d} upstream calls, "
+              f"{ok} answered")
+
+    # 2. shared quota across processes, warm every symbol first so there is something stale
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+    for symbol in symbols:
+        helpers.lookup(symbol)
+    finnhub.client.limiter = limiter
+    time.sleep(1.1)  # everything expires, every lookup from here on needs upstream
+    stub.reset()
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    started = time.monotonic()
+    workers = [context.Process(target=hammer, args=(symbols, args.threads, args.seconds, queue))
+               for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    outcomes = Counter()
+    for _ in workers:
+        outcomes.update(queue.get())
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    allowed = args.burst + args.rate_limit / 60 * elapsed
+    total = sum(outcomes.values())
+    print(f"quota        {args.processes} processes x {args.threads} threads for {elapsed:.1f}s: "
+          f"{stub.total_calls()} upstream calls (quota allows {allowed:.0f}), "
+          f"{total} lookups: {outcomes['fresh']} fresh, {outcomes['stale']} stale, "
+          f"{outcomes['error']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Quote providers under a slow or dead primary: hedged requests and failover.
+
+Finnhub is the local stub, the secondary is a replay file of the same symbols.
+
+1. Slow tail: the stub answers in --latency, but --slow-rate of calls take
+   --slow-latency. --lookups cold quotes (cache off) are timed with Finnhub alone,
+   then with replay as a hedge after QUOTE_HEDGE_MS.
+2. Outage: the stub fails every call. Quotes are answered by replay when it is
+   configured and from last_prices when nothing is, and the answers are counted by
+   where they came from.
+
+    python bench/quote_failover.py --slow-rate 0.05 --slow-latency 1.0
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import finnhub_stub  # noqa: E402  (bench/ is on sys.path when run as a script)
+from load_test import SYMBOLS, write_replay  # noqa: E402
+
+
+def timed_lookups(fetch, symbols):
+    runs, sources = [], Counter()
+    for symbol in symbols:
+        started = time.perf_counter()
+        quote = fetch(symbol)
+        runs.append(time.perf_counter() - started)
+        sources["error" if "price" not in quote else
+                f"{quote['provider']} (stale)" if quote.get("stale") else quote["provider"]] += 1
+    runs.sort()
+    return runs, sources
+
+
+def report(label, runs, sources):
+    p99 = runs[min(int(len(runs) * 0.99), len(runs) - 1)]
+    print(f"{label:<28} p50 {statistics.median(runs) * 1000:6.0f} ms   p99 {p99 * 1000:6.0f} ms   "
+          f"max {runs[-1] * 1000:6.0f} ms   {dict(sources)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--hedge-ms", type=float, default=150)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=4)
+    args = parser.parse_args()
+
+    _, stub, stub_url = finnhub_stub.start(latency=args.latency, jitter=0.01, slow_rate=args.slow_rate,
+                                           slow_latency=args.slow_latency, seed=args.seed)
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        "FINNHUB_BASE_URL": stub_url, "FINNHUB_API_KEY": "stub", "FINNHUB_RATE_LIMIT": "0",
+        "FINNHUB_MAX_RETRIES": "0", "QUOTE_CACHE_TTL": "0", "QUOTE_STALE_TTL": "0",
+        "QUOTE_PROVIDERS": "finnhub,replay", "QUOTE_HEDGE_MS": str(args.hedge_ms),
+        "QUOTE_REPLAY_PATH": write_replay(directory, random.Random(args.seed)),
+    })
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{directory}/failover.db")
+
+    from app import app
+    from helpers import fetch_quote, quote_providers
+    from startup import upgrade_database
+
+    upgrade_database(app)
+    rng = random.Random(args.seed)
+    symbols = [rng.choice(SYMBOLS) for _ in range(args.lookups)]
+    finnhub, replay = quote_providers.providers
+    hedge_delay = quote_providers.hedge_delay
+
+    with app.app_context():
+        # Company names into the symbols table first, so every lookup below is one quote call
+        for symbol in SYMBOLS:
+            fetch_quote(symbol)
+
+        print(f"1. Finnhub p50 {args.latency * 1000:.0f} ms, {args.slow_rate:.0%} of calls "
+              f"{args.slow_latency * 1000:.0f} ms")
+        quote_providers.providers, quote_providers.hedge_delay = [finnhub], 0
+        report("finnhub only", *timed_lookups(fetch_quote, symbols))
+        quote_providers.providers, quote_providers.hedge_delay = [finnhub, replay], hedge_delay
+        report(f"hedged after {args.hedge_ms:.0f} ms", *timed_lookups(fetch_quote, symbols))
+
+        print("\n2. Finnhub down (every call 503)")
+        stub.error_rate = 1.0
+        report("finnhub, replay", *timed_lookups(fetch_quote, symbols))
+        quote_providers.providers = [finnhub]
+        report("finnhub only", *timed_lookups(fetch_quote, symbols))
+        print(f"\nprovider health: {quote_providers.stats()}")
+
+
+if __name__ == "__main__":
+    main()
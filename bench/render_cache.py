@@ -0,0 +1,102 @@
+"""
+Template compile and render cost, with and without the bytecode and fragment caches.
+
+- compile: load every template into a fresh Jinja environment, once parsing the source
+  (what each new worker used to do) and once from a warm FileSystemBytecodeCache
+- render: / and /history for a seeded user through the Flask test client, once with the
+  fragment cache disabled (every view re-renders the holdings rows and the history
+  table) and once with it on (every view after the first is a hit)
+
+Quotes are put in the quote cache up front, so no quote traffic is involved.
+
+    python bench/render_cache.py --holdings 40 --trades 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/render.db"
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app import app  # noqa: E402
+from database import db  # noqa: E402
+from fragments import fragment_cache  # noqa: E402
+from helpers import quote_cache, usd  # noqa: E402
+from models import Buy, Position, User  # noqa: E402
+from startup import upgrade_database  # noqa: E402
+
+
+def compile_all(bytecode_cache):
+    env = Environment(loader=FileSystemLoader(os.path.join(app.root_path, app.template_folder)),
+                      bytecode_cache=bytecode_cache)
+    env.filters["usd"] = usd
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+
+
+def timed(fn, *args, repeat=1):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs)
+
+
+def seed(holdings, trades, rng):
+    symbols = [f"S{i:03d}" for i in range(holdings)]
+    db.session.add(User(id=1, username="reader", hash="x", cash=10000))
+    db.session.execute(insert(Buy), [{"user_id": 1, "symbol": rng.choice(symbols),
+                                      "shares": rng.randint(1, 20), "price": round(rng.uniform(10, 500), 2)}
+                                     for _ in range(trades)])
+    db.session.execute(insert(Position), [{"user_id": 1, "symbol": symbol, "shares": rng.randint(1, 50),
+                                           "cost_basis": 1000} for symbol in symbols])
+    db.session.commit()
+    for symbol in symbols:
+        quote_cache.set(symbol, {"symbol": symbol, "name": symbol, "price": round(rng.uniform(10, 500), 2)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--holdings", type=int, default=40, help="symbols held (rows on /)")
+    parser.add_argument("--trades", type=int, default=200, help="seeded transactions")
+    parser.add_argument("--requests", type=int, default=200, help="views per page and mode")
+    parser.add_argument("--seed", type=int, default=9)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    cold = timed(compile_all, None, repeat=5)
+    compile_all(FileSystemBytecodeCache(cache_dir))
+    warm = timed(compile_all, FileSystemBytecodeCache(cache_dir), repeat=5)
+    print(f"compile all templates, from source        {cold * 1000:7.1f} ms")
+    print(f"compile all templates, bytecode cache     {warm * 1000:7.1f} ms")
+
+    upgrade_database(app)
+    quote_cache.ttl = 3600
+    with app.app_context():
+        seed(args.holdings, args.trades, random.Random(args.seed))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    max_size = fragment_cache.max_size
+    for page in ("/", "/history"):
+        for label, size in (("no fragment cache", 0), ("fragment cache", max_size)):
+            fragment_cache.max_size = size
+            client.get(page)
+            seconds = timed(client.get, page, repeat=args.requests)
+            print(f"{page:<9} {label:<32}{seconds * 1000:7.2f} ms")
+    print(f"fragment cache: {fragment_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-request session overhead for each SESSION_BACKEND.
+
+Builds a bare Flask app per backend (same config the real app uses, plus the old
+filesystem setup as the baseline), logs in once and then times requests that only
+read session["user_id"], so the numbers are the cost of loading and saving the
+session and nothing else.
+
+    python bench/session_overhead.py --requests 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, flash, session
+
+import sessions
+from database import db
+from models import SessionRecord
+
+
+def build_app(backend, workdir, refresh_each_request):
+    os.environ["SESSION_BACKEND"] = backend
+    # Flask-Session's filesystem backend writes into ./flask_session
+    os.chdir(workdir)
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "bench"
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{workdir}/sessions.db"
+    db.init_app(app)
+    with app.app_context():
+        # The migrations make it in the app, only this table is needed here
+        SessionRecord.__table__.create(db.engine)
+    sessions.configure(app, db)
+    if refresh_each_request:
+        # What the app did before: filesystem sessions rewritten on every request
+        app.config["SESSION_REFRESH_EACH_REQUEST"] = True
+
+    @app.route("/login")
+    def login():
+        session["user_id"] = 1
+        flash("Welcome!")
+        return "ok"
+
+    @app.route("/page")
+    def page():
+        return str(session.get("user_id"))
+
+    return app
+
+
+def run(name, backend, requests, refresh_each_request=False):
+    workdir = tempfile.mkdtemp()
+    app = build_app(backend, workdir, refresh_each_request)
+    client = app.test_client()
+    client.get("/login")
+    client.get("/page")  # consume the flash, warm up
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get("/page")
+        timings.append((time.perf_counter() - started) * 1e6)
+
+    timings.sort()
+    return {
+        "backend": name,
+        "mean_us": statistics.fmean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p95_us": timings[int(len(timings) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    baseline = run("old default", "filesystem", args.requests, refresh_each_request=True)
+    results = [baseline] + [run(backend, backend, args.requests) for backend in sessions.BACKENDS]
+
+    print(f"{'backend':<14}{'mean µs':>10}{'p50 µs':>10}{'p95 µs':>10}{'vs old default':>16}")
+    for r in results:
+        print(f"{r['backend']:<14}{r['mean_us']:>10.0f}{r['p50_us']:>10.0f}{r['p95_us']:>10.0f}"
+              f"{r['mean_us'] / baseline['mean_us']:>15.2f}x")
+    print("(filesystem numbers are for a local disk, shared or network disks make them worse)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Symbol search latency and memory: the prefix index vs scanning the listing.
+
+Writes a synthetic listing of --symbols tickers with made-up company names, loads it
+into a SymbolIndex and times, per call:
+
+- search() for random ticker prefixes (1-3 letters) and company-name word prefixes
+- known() for real and misspelled tickers, which is what lookup() pays before
+  deciding whether a quote is worth an upstream call
+- the same prefix search done as a plain scan over every (symbol, name) pair
+
+    python bench/symbol_search.py --symbols 30000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from symbol_index import SymbolIndex, write_listing  # noqa: E402
+
+WORDS = ["apple", "applied", "american", "bank", "capital", "digital", "energy", "first", "global",
+         "health", "holdings", "industries", "international", "micro", "national", "networks",
+         "pharma", "resources", "semiconductor", "systems", "technologies", "therapeutics", "trust"]
+
+
+def listing(count, rng):
+    rows = {}
+    while len(rows) < count:
+        symbol = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 5)))
+        words = rng.sample(WORDS, rng.randint(1, 3))
+        rows[symbol] = " ".join(word.capitalize() for word in words) + rng.choice([" Inc", " Corp", " Ltd", ""])
+    return rows
+
+
+def scan(rows, query, limit=10):
+    prefix, term = query.upper(), query.lower()
+    found = {symbol for symbol in rows if symbol.startswith(prefix)}
+    found.update(symbol for symbol, name in rows.items()
+                 if any(word.startswith(term) for word in name.lower().split()))
+    return sorted(found)[:limit]
+
+
+def per_call(fn, args):
+    started = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - started) / len(args) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=30_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = listing(args.symbols, rng)
+    path = os.path.join(tempfile.mkdtemp(), "symbol_list.csv")
+    write_listing(path, rows.items())
+
+    index = SymbolIndex(path)
+    started = time.perf_counter()
+    index.load()
+    load_seconds = time.perf_counter() - started
+    tracemalloc.start()
+    measured = SymbolIndex(path)
+    measured.load()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del measured
+    print(f"loaded {len(index):,} symbols in {load_seconds * 1000:.0f} ms, {memory / 1e6:.1f} MB")
+
+    tickers = list(rows)
+    ticker_prefixes = [rng.choice(tickers)[:rng.randint(1, 3)] for _ in range(args.queries)]
+    name_prefixes = [rng.choice(WORDS)[:rng.randint(2, 5)] for _ in range(args.queries)]
+    real = [rng.choice(tickers) for _ in range(args.queries)]
+    typos = [symbol + "Q" for symbol in real]
+
+    print(f"search, ticker prefix        {per_call(index.search, ticker_prefixes):8.1f} µs")
+    print(f"search, name prefix          {per_call(index.search, name_prefixes):8.1f} µs")
+    print(f"known, real ticker           {per_call(index.known, real):8.2f} µs")
+    print(f"known, misspelled ticker     {per_call(index.known, typos):8.2f} µs")
+    few = ticker_prefixes[:50]
+    print(f"scan, ticker prefix          {per_call(lambda q: scan(rows, q), few):8.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
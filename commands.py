@@ -0,0 +1,275 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from database import db
+from models import Buy, Position, apply_trade
+
+positions_cli = AppGroup("positions", help="Maintain the positions table.")
+prices_cli = AppGroup("prices", help="Manage the on-disk price history.")
+orders_cli = AppGroup("orders", help="Limit and stop orders.")
+leaderboard_cli = AppGroup("leaderboard", help="Competition leaderboard.")
+symbols_cli = AppGroup("symbols", help="The ticker listing behind symbol search.")
+
+
+def replay_ledger():
+    """Recompute every position from the transactions ledger, oldest trade first."""
+    totals = {}
+    rows = (db.session.query(Buy.user_id, Buy.symbol, Buy.shares, Buy.price)
+            .order_by(Buy.user_id, Buy.symbol, Buy.timestamp, Buy.id)
+            .yield_per(10000))
+    for user_id, symbol, shares, price in rows:
+        held, cost = totals.get((user_id, symbol), (0, 0.0))
+        totals[(user_id, symbol)] = apply_trade(held, cost, shares, price)
+    return totals
+
+
+@positions_cli.command("rebuild")
+def rebuild_positions():
+    """Throw away the positions table and rebuild it from transactions."""
+    totals = replay_ledger()
+    Position.query.delete()
+    db.session.bulk_insert_mappings(Position, [
+        {"user_id": user_id, "symbol": symbol, "shares": held, "cost_basis": cost}
+        for (user_id, symbol), (held, cost) in totals.items()
+    ])
+    db.session.commit()
+    click.echo(f"✅ Rebuilt {len(totals)} positions from the ledger")
+
+
+@positions_cli.command("verify")
+def verify_positions():
+    """Compare the positions table with the transactions ledger."""
+    expected = replay_ledger()
+    actual = {(p.user_id, p.symbol): (p.shares, p.cost_basis) for p in Position.query.all()}
+
+    problems = 0
+    for key in sorted(expected.keys() | actual.keys()):
+        want = expected.get(key, (0, 0.0))
+        got = actual.get(key, (0, 0.0))
+        if want[0] != got[0] or abs(want[1] - got[1]) > 0.01:
+            problems += 1
+            click.echo(f"❌ user {key[0]} {key[1]}: ledger {want[0]} shares / {want[1]:.2f}, "
+                       f"positions {got[0]} shares / {got[1]:.2f}")
+
+    if problems:
+        raise click.ClickException(f"{problems} positions out of step, run `flask positions rebuild`")
+    click.echo(f"✅ {len(expected)} positions match the ledger")
+
+
+@prices_cli.command("ingest")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--symbol", help="Symbol for files without a symbol column (e.g. AAPL.csv).")
+@click.option("--chunk-size", default=500_000, show_default=True, help="CSV rows read at a time.")
+def ingest_prices(files, symbol, chunk_size):
+    """
+    Append OHLCV bars from CSV files to the price history.
+
+    Columns: [symbol,] timestamp, open, high, low, close, volume. Timestamps are
+    unix seconds or anything pandas can parse (UTC). Bars older than what is
+    already stored for a symbol are skipped.
+    """
+    import pandas as pd
+
+    from price_history import store
+
+    written, skipped = 0, 0
+    for path in files:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            chunk.columns = [c.strip().lower() for c in chunk.columns]
+            if symbol:
+                chunk["symbol"] = symbol
+            elif "symbol" not in chunk:
+                raise click.ClickException(f"{path} has no symbol column, pass --symbol")
+
+            if pd.api.types.is_numeric_dtype(chunk["timestamp"]):
+                chunk["timestamp"] = chunk["timestamp"].astype("int64")
+            else:
+                parsed = pd.to_datetime(chunk["timestamp"], utc=True)
+                chunk["timestamp"] = (parsed - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+
+            chunk = chunk.sort_values(["symbol", "timestamp"], kind="stable")
+            chunk = chunk.drop_duplicates(["symbol", "timestamp"], keep="last")
+            for name, bars in chunk.groupby("symbol", sort=False):
+                try:
+                    count = store.append(str(name), bars["timestamp"], bars["open"], bars["high"],
+                                         bars["low"], bars["close"], bars["volume"])
+                except ValueError as e:
+                    raise click.ClickException(f"{path}: {name}: {e}")
+                written += count
+                skipped += len(bars) - count
+
+    click.echo(f"✅ Stored {written:,} bars ({skipped:,} already present) "
+               f"for {len(store.symbols())} symbols in {store.root}")
+
+
+@prices_cli.command("info")
+@click.argument("symbol", required=False)
+def prices_info(symbol):
+    """Bar count and time span per symbol."""
+    from datetime import datetime, timezone
+
+    from price_history import store
+
+    for name in [symbol.upper()] if symbol else store.symbols():
+        bars = store.read(name)
+        if not len(bars):
+            click.echo(f"{name}: no history")
+            continue
+        first, last = (datetime.fromtimestamp(int(t), timezone.utc) for t in bars.timestamp[[0, -1]])
+        click.echo(f"{name}: {len(bars):,} bars, {first:%Y-%m-%d %H:%M} → {last:%Y-%m-%d %H:%M} UTC")
+
+
+@orders_cli.command("engine")
+@click.option("--once", is_flag=True, help="Run a single tick and exit.")
+def run_engine(once):
+    """Fill resting limit/stop orders as prices cross their triggers (run one of these)."""
+    from matching import engine
+
+    engine.init_app(current_app._get_current_object())
+    if once:
+        loaded = engine.sync()
+        click.echo(f"✅ {engine.tick()} orders filled ({loaded} open orders loaded)")
+        return
+    engine.run()
+
+
+@leaderboard_cli.command("run")
+@click.option("--once", is_flag=True, help="Refresh once and exit.")
+def run_leaderboard(once):
+    """Re-rank every user by portfolio value every LEADERBOARD_INTERVAL seconds (run one of these)."""
+    from leaderboard import job
+
+    job.init_app(current_app._get_current_object())
+    if once:
+        written, priced = job.refresh()
+        click.echo(f"✅ Leaderboard refreshed: {written} rows changed, {priced} symbols priced")
+        return
+    job.run()
+
+
+def read_listing(path):
+    """(symbol, name) pairs from a CSV with symbol and name/description columns, or a Finnhub JSON dump."""
+    import csv
+    import json
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = [{key.strip().lower(): value for key, value in row.items() if key}
+                    for row in csv.DictReader(f)]
+    for row in rows:
+        symbol = (row.get("symbol") or "").strip().upper()
+        name = (row.get("name") or row.get("description") or "").strip()
+        if symbol:
+            yield symbol, name
+
+
+@symbols_cli.command("refresh")
+@click.option("--exchange", multiple=True, default=["US"], show_default=True,
+              help="Finnhub exchange code, repeat for several.")
+@click.option("--from-file", "source", type=click.Path(exists=True, dir_okay=False),
+              help="Build the listing from this CSV/JSON instead of asking Finnhub.")
+def refresh_symbols(exchange, source):
+    """Rewrite the listing file (SYMBOL_LIST_PATH) that symbol search and validation use."""
+    import finnhub
+    from symbol_index import symbol_index, write_listing
+
+    if source:
+        listing = dict(read_listing(source))
+    else:
+        listing = {}
+        for code in exchange:
+            try:
+                rows = finnhub.client.get("stock/symbol", exchange=code)
+            except finnhub.FinnhubError as e:
+                raise click.ClickException(f"Finnhub stock/symbol?exchange={code}: {e}")
+            for row in rows:
+                if row.get("symbol"):
+                    listing[row["symbol"].upper()] = (row.get("description") or "").strip()
+    if not listing:
+        raise click.ClickException("No symbols found, listing left as it was")
+
+    write_listing(symbol_index.path, listing.items())
+    click.echo(f"✅ Wrote {symbol_index.load():,} symbols to {symbol_index.path}")
+
+
+@symbols_cli.command("search")
+@click.argument("query")
+@click.option("--limit", default=10, show_default=True)
+def search_symbols(query, limit):
+    """What /api/v1/symbols?q= would answer."""
+    from symbol_index import symbol_index
+
+    for symbol, name in symbol_index.search(query, limit):
+        click.echo(f"{symbol:<10}{name}")
+
+
+@click.command("seed")
+@click.option("--users", default=1000, show_default=True, help="Accounts to create.")
+@click.option("--trades", default=100, show_default=True, help="Mean transactions per user.")
+@click.option("--trade-dist", type=click.Choice(["fixed", "uniform", "exponential", "pareto"]),
+              default="exponential", show_default=True, help="How trade counts spread around the mean.")
+@click.option("--max-trades", default=5000, show_default=True, help="Cap on one user's transactions.")
+@click.option("--symbols", default=500, show_default=True,
+              help="Tickers traded, taken from the symbol listing when there is one.")
+@click.option("--symbol-skew", default=1.1, show_default=True,
+              help="Zipf exponent of symbol popularity, 0 for uniform.")
+@click.option("--sell-ratio", default=0.3, show_default=True, help="Share of trades that sell something held.")
+@click.option("--max-shares", default=50, show_default=True, help="Largest single buy.")
+@click.option("--days", default=365, show_default=True, help="History spread over this many days up to now.")
+@click.option("--cash", default=10000.0, show_default=True, help="Starting cash per user.")
+@click.option("--password", default="password", show_default=True, help="Every seeded user's password.")
+@click.option("--prefix", default="seed", show_default=True, help="Usernames are <prefix>-<id>.")
+@click.option("--seed", "random_seed", default=1, show_default=True, help="Same seed, same data.")
+@click.option("--batch-rows", default=50_000, show_default=True, help="Transactions per insert batch/commit.")
+@click.option("--workers", default=min(os.cpu_count() or 1, 4), show_default=True,
+              help="Processes generating data while the main one writes.")
+def seed_data(users, trades, trade_dist, max_trades, symbols, symbol_skew, sell_ratio, max_shares, days, cash,
+              password, prefix, random_seed, batch_rows, workers):
+    """Bulk-generate users and consistent trade histories for capacity planning."""
+    import time
+
+    from seed import SeedOptions, seed
+    from symbol_index import symbol_index
+
+    options = SeedOptions(users=users, trades=trades, trade_dist=trade_dist, max_trades=max_trades,
+                          symbols=symbols, symbol_skew=symbol_skew, sell_ratio=sell_ratio,
+                          max_shares=max_shares, days=days, cash=cash, password=password, prefix=prefix,
+                          seed=random_seed)
+    started = time.perf_counter()
+    totals = (0, 0, 0)
+    try:
+        for totals in seed(options, batch_rows=batch_rows, workers=workers, listing=symbol_index.tickers()):
+            elapsed = time.perf_counter() - started
+            click.echo(f"  {totals[0]:,} users, {totals[1]:,} transactions "
+                       f"({totals[1] / elapsed * 60 / 1e6:.1f}M rows/min)")
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    elapsed = time.perf_counter() - started
+    click.echo(f"✅ Seeded {totals[0]:,} users, {totals[1]:,} transactions and {totals[2]:,} positions "
+               f"in {elapsed:.1f}s. Run `flask leaderboard run --once` to rank them")
+
+
+@click.command("setup-db")
+def setup_db():
+    """Apply pending migrations once (advisory-locked, safe to run from every container)."""
+    from startup import upgrade_database
+
+    ran = upgrade_database(current_app._get_current_object())
+    click.echo("✅ Migrations applied" if ran else "✅ Database already up to date")
+
+
+def init_app(app):
+    """Register the CLI commands on the app."""
+    app.cli.add_command(positions_cli)
+    app.cli.add_command(prices_cli)
+    app.cli.add_command(orders_cli)
+    app.cli.add_command(leaderboard_cli)
+    app.cli.add_command(symbols_cli)
+    app.cli.add_command(setup_db)
+    app.cli.add_command(seed_data)
@@ -0,0 +1,315 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics, observe_upstream
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FinnhubError(Exception):
+    """Raised when Finnhub can't give us an answer."""
+
+
+class CircuitOpenError(FinnhubError):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+class RateLimitedError(FinnhubError):
+    """Raised without touching the network when the API quota is used up for now."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while upstream is down.
+
+    After `threshold` consecutive failures the breaker opens for `cooldown` seconds,
+    then lets a single trial request through (half-open) to see if upstream is back.
+    """
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Return True if a request may go upstream right now."""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release(self):
+        """Hand back a half-open trial that never went upstream."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class TokenBucket:
+    """
+    Stay inside the upstream API quota: `rate` calls per `period` seconds, `burst` saved up.
+
+    acquire() reserves the next token and sleeps until it is due, as long as that is no
+    more than `max_wait` seconds away. Otherwise it returns False straight away and
+    takes nothing. Reservations are handed out in order, so a queue of callers spreads
+    out at exactly the quota rate instead of all retrying at once.
+
+    With shared_path the bucket is one row in a SQLite file, so every gunicorn worker
+    on the box (they all use the same API key) draws from the same quota. Without it
+    each process has its own bucket. rate=0 turns the limiter off.
+    """
+
+    def __init__(self, rate=60, period=60, burst=30, max_wait=1.0, shared_path=None):
+        self.per_second = rate / period if period > 0 else 0
+        self.burst = max(burst, 1)
+        self.max_wait = max_wait
+        self.shared_path = shared_path
+        self._tokens = float(self.burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def acquire(self, max_wait=None):
+        """Take a token, waiting up to max_wait seconds for one. False if that isn't enough."""
+        if not self.per_second:
+            return True
+        wait = self._reserve(self.max_wait if max_wait is None else max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def drain(self):
+        """Upstream said 429, so our idea of the quota is off: make everyone wait for new tokens."""
+        if not self.per_second:
+            return
+        conn = self._shared_conn()
+        if conn is None:
+            with self._lock:
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = time.time()
+            return
+        try:
+            conn.execute("UPDATE bucket SET tokens = min(tokens, 0), updated = ? WHERE name = 'finnhub'",
+                         (time.time(),))
+        except sqlite3.Error:
+            pass
+
+    def _reserve(self, max_wait):
+        """Seconds until our token is due (0 if one is there now), None if more than max_wait."""
+        conn = self._shared_conn()
+        if conn is None:
+            with self._lock:
+                self._tokens, self._updated, wait = self._take(self._tokens, self._updated, max_wait)
+            return wait
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated = conn.execute(
+                    "SELECT tokens, updated FROM bucket WHERE name = 'finnhub'").fetchone()
+                tokens, updated, wait = self._take(tokens, updated, max_wait)
+                conn.execute("UPDATE bucket SET tokens = ?, updated = ? WHERE name = 'finnhub'",
+                             (tokens, updated))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return wait
+        except sqlite3.Error:
+            # Shared file busy or broken, better to let the call through than to fail every quote
+            return 0.0
+
+    def _take(self, tokens, updated, max_wait):
+        now = time.time()
+        tokens = min(self.burst, tokens + max(now - updated, 0) * self.per_second)
+        wait = max(1 - tokens, 0) / self.per_second
+        if wait > max_wait:
+            return tokens, now, None
+        # Going below zero is a reservation: the next caller queues behind us
+        return tokens - 1, now, wait
+
+    def _shared_conn(self):
+        """One autocommit connection per thread (and per process, gunicorn forks after import)."""
+        if not self.shared_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        try:
+            conn = sqlite3.connect(self.shared_path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket ("
+                         "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO bucket (name, tokens, updated) VALUES ('finnhub', ?, ?)",
+                         (float(self.burst), time.time()))
+        except sqlite3.Error:
+            return None
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+class FinnhubClient:
+    """Keep-alive HTTP client for the Finnhub REST API with timeouts, retries, a breaker and a quota."""
+
+    def __init__(self, base_url="https://finnhub.io/api/v1", api_key=None, connect_timeout=3.05,
+                 read_timeout=5, max_retries=2, backoff=0.2, pool_size=20, breaker=None, limiter=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or TokenBucket(rate=0)
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build the client from FINNHUB_* environment variables."""
+        return cls(
+            base_url=os.environ.get("FINNHUB_BASE_URL", "https://finnhub.io/api/v1"),
+            connect_timeout=float(os.environ.get("FINNHUB_CONNECT_TIMEOUT", 3.05)),
+            read_timeout=float(os.environ.get("FINNHUB_READ_TIMEOUT", 5)),
+            max_retries=int(os.environ.get("FINNHUB_MAX_RETRIES", 2)),
+            pool_size=int(os.environ.get("FINNHUB_POOL_SIZE", 20)),
+            breaker=CircuitBreaker(
+                threshold=int(os.environ.get("FINNHUB_BREAKER_THRESHOLD", 5)),
+                cooldown=float(os.environ.get("FINNHUB_BREAKER_COOLDOWN", 30)),
+            ),
+            limiter=TokenBucket(
+                rate=float(os.environ.get("FINNHUB_RATE_LIMIT", 60)),
+                period=float(os.environ.get("FINNHUB_RATE_PERIOD", 60)),
+                burst=float(os.environ.get("FINNHUB_RATE_BURST", 30)),
+                max_wait=float(os.environ.get("FINNHUB_RATE_WAIT", 1.0)),
+                shared_path=os.environ.get("FINNHUB_RATE_DB") or os.environ.get("QUOTE_CACHE_DB") or None,
+            ),
+        )
+
+    @property
+    def session(self):
+        """Pooled session, rebuilt after a fork so workers never share sockets."""
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def get(self, path, **params):
+        """GET base_url/path and return the decoded JSON body."""
+        # Breaker first, so an outage fails fast without spending quota or waiting for it
+        if not self.breaker.allow():
+            raise CircuitOpenError("Quote service temporarily unavailable")
+        if not self.limiter.acquire():
+            # Nothing went upstream, hand back the half-open trial if this was it
+            self.breaker.release()
+            metrics.registry.inc("finnhub_rate_limited_total", endpoint=path)
+            raise RateLimitedError("Quote service busy, try again shortly")
+
+        params["token"] = self.api_key or os.environ.get("FINNHUB_API_KEY")
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        settled = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt and not self.limiter.acquire():
+                    break  # no quota left for retries, give up with the last error
+                retry_after = None
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                    observe_upstream(path, str(response.status_code), time.perf_counter() - started)
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        data = response.json()
+                        settled = True
+                        self.breaker.record_success()
+                        return data
+                    error = FinnhubError(f"Finnhub returned {response.status_code}")
+                    retry_after = response.headers.get("Retry-After")
+                    if response.status_code == 429:
+                        self.limiter.drain()
+                except (requests.ConnectionError, requests.Timeout,
+                        requests.exceptions.ChunkedEncodingError) as e:
+                    observe_upstream(path, type(e).__name__, time.perf_counter() - started)
+                    error = FinnhubError(f"Finnhub unreachable: {e}")
+                except (requests.HTTPError, requests.JSONDecodeError) as e:
+                    # 4xx other than 429 or a garbage body, retrying won't help
+                    settled = True
+                    self.breaker.record_success()
+                    raise FinnhubError(str(e)) from e
+                except requests.RequestException as e:
+                    # Anything else requests raises (bad URL, too many redirects...), retrying won't help
+                    observe_upstream(path, type(e).__name__, time.perf_counter() - started)
+                    settled = True
+                    self.breaker.record_failure()
+                    raise FinnhubError(f"Finnhub request failed: {e}") from e
+
+                if attempt < self.max_retries:
+                    time.sleep(self._delay(attempt, retry_after))
+
+            settled = True
+            self.breaker.record_failure()
+            raise error
+        finally:
+            # Whatever else went wrong, a half-open trial must not stay taken forever
+            if not settled:
+                self.breaker.release()
+
+    def _delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, capped by a Retry-After header if we got one."""
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), 5.0))
+            except ValueError:
+                pass
+        return delay
+
+
+# One pooled client per worker process
+client = FinnhubClient.from_env()
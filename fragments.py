@@ -0,0 +1,79 @@
+"""
+Rendered template fragments, cached per worker.
+
+The holdings rows on / and the history table are the most expensive parts of their
+pages to render: a Jinja loop with the usd filter on every cell. Their content only
+changes when the user's ledger does (users.ledger_version, bumped by every ledger
+write) or, for holdings, when one of the prices does. So those go into the key and a
+cached fragment never has to be invalidated, it just stops being asked for. The TTL
+is only a safety net for ledger writes that bypass ledger.py (seed scripts, manual SQL).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import render_template
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """LRU of rendered HTML keyed by tuples, with a TTL."""
+
+    def __init__(self, max_size=2000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from FRAGMENT_CACHE_* environment variables."""
+        return cls(
+            max_size=int(os.environ.get("FRAGMENT_CACHE_SIZE", 2000)),
+            ttl=float(os.environ.get("FRAGMENT_CACHE_TTL", 300)),
+        )
+
+    def get(self, key):
+        """Cached Markup for key, or None."""
+        if not self.max_size:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, html):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._entries[key] = (html, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def render(self, key, template, **context):
+        """render_template(template, **context) as Markup, unless key is already cached."""
+        html = self.get(key)
+        if html is None:
+            html = Markup(render_template(template, **context))
+            self.set(key, html)
+        return html
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+def price_version(prices):
+    """Stands in for 'the prices these holdings were rendered with' in a cache key."""
+    return hash(tuple(sorted(prices.items())))
+
+
+fragment_cache = FragmentCache.from_env()
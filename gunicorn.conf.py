@@ -0,0 +1,88 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn runs from this directory:
+
+    gunicorn app:app
+
+The master imports the app once (preload_app), runs migrations once under an advisory
+lock, compiles the templates, then forks workers that start with everything already
+imported. Nothing about the database happens at worker import time.
+
+With GUNICORN_PRELOAD=0 the master never imports the app: migrations run in a
+`flask setup-db` subprocess and every worker imports the app itself.
+"""
+import os
+import glob
+import subprocess
+import sys
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# SSE streams hold a thread each, see README
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+timeout = 60
+
+
+def on_starting(server):
+    """Master, before any worker exists: clear stale metrics snapshots and migrate once."""
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, "metrics-*.json")):
+            os.remove(path)
+
+    if os.environ.get("SKIP_MIGRATIONS"):
+        server.log.info("Skipping migrations (SKIP_MIGRATIONS is set)")
+        return
+
+    started = time.perf_counter()
+    if server.cfg.preload_app:
+        from app import app
+        from startup import upgrade_database
+
+        upgrade_database(app)
+    else:
+        # Importing the app here would hand it to every worker through sys.modules
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "setup-db"],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    server.log.info(f"Database ready in {time.perf_counter() - started:.2f}s")
+
+
+def when_ready(server):
+    """Master: compile every template, then drop connections opened while migrating."""
+    if "app" not in sys.modules:
+        return
+    from app import app
+    from database import db
+
+    # Workers inherit the compiled templates, and the bytecode cache on disk is warm
+    # for workers started without preload
+    started = time.perf_counter()
+    templates = app.jinja_env.list_templates(extensions=["html"])
+    for name in templates:
+        app.jinja_env.get_template(name)
+    server.log.info(f"Compiled {len(templates)} templates in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    with app.app_context():
+        db.engine.dispose()
+
+
+def pre_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_fork(server, worker):
+    # Belt and braces: never reuse a pooled connection from the master
+    if "app" not in sys.modules:
+        return
+    from app import app
+    from database import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    elapsed = (time.perf_counter() - worker.forked_at) * 1000
+    worker.log.info(f"Worker {worker.pid} ready {elapsed:.0f} ms after fork")
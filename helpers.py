@@ -1,8 +1,28 @@
-import requests
 import os
 
-from flask import redirect, render_template, session
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from flask import current_app, has_app_context, redirect, render_template, session
 from functools import wraps
+from sqlalchemy.exc import SQLAlchemyError
+
+import finnhub
+from database import db
+from metrics import metrics, timed
+from models import Buy, LastPrice, Symbol
+from providers import ProviderChain, ProviderError, UnknownSymbol
+from quote_cache import QuoteCache, SingleFlight
+from symbol_index import symbol_index
+
+# Shared by every request in this worker (and across workers when QUOTE_CACHE_DB is set)
+quote_cache = QuoteCache.from_env()
+
+# Concurrent misses for one symbol share a single upstream fetch
+quote_flights = SingleFlight()
+
+# Bounded so a huge portfolio can't open hundreds of upstream connections at once
+lookup_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("LOOKUP_POOL_SIZE", 8)),
+                                 thread_name_prefix="lookup")
 
 
 #This function is credited to my teacher. who themselves used this code found here - https://github.com/jacebrowning/memegen
@@ -49,44 +69,251 @@ def login_required(f):
 
 
 def lookup(symbol):
-    """Look up quote for symbol using Finnhub API."""
-    api_key = os.environ.get("FINNHUB_API_KEY")
-    if not api_key:
-        return {"error": "API key not configured"}
+    """Look up quote for symbol, served from the quote cache when it is fresh."""
+    with timed("quote", source="cache") as labels:
+        cached = quote_cache.get(symbol)
+        if cached is not None:
+            return cached
+        labels["source"] = "upstream"
+        return fetch_and_cache(symbol)
 
-    try:
-        # Get stock price
-        quote_url = f"https://finnhub.io/api/v1/quote?symbol={symbol.upper()}&token={api_key}"
-        quote_response = requests.get(quote_url)
-        quote_response.raise_for_status()
-        quote_data = quote_response.json()
-
-        # Get company name
-        profile_url = f"https://finnhub.io/api/v1/stock/profile2?symbol={symbol.upper()}&token={api_key}"
-        profile_response = requests.get(profile_url)
-        profile_response.raise_for_status()
-        profile_data = profile_response.json()
-
-        current_price = quote_data.get("c")
-
-        # Check if we got valid data
-        if current_price is None or current_price == 0:
-            return {"error": "Invalid symbol or no data available"}
-
-        # Also check if we got a valid company name (additional validation)
-        company_name = profile_data.get("name")
-        if not company_name:
-            return {"error": "Invalid symbol or no data available"}
-
-        return {
-            "name": profile_data.get("name", symbol.upper()),
-            "price": float(quote_data.get("c", 0)),  # 'c' is current price
-            "symbol": symbol.upper()
-        }
 
+def lookup_many(symbols, deadline=None):
+    """
+    Look up quotes for several symbols at once.
+
+    Cache misses are fetched concurrently on a bounded thread pool. Anything still
+    running after `deadline` seconds comes back as an error dict so the caller can
+    fall back, the same way it would for a failed lookup().
+    """
+    with timed("quote", source="batch"):
+        return _lookup_many(symbols, deadline)
+
+
+def _lookup_many(symbols, deadline):
+    if deadline is None:
+        deadline = float(os.environ.get("LOOKUP_DEADLINE", 2.0))
+
+    results = {}
+    missing = []
+    for symbol in dict.fromkeys(symbol.upper() for symbol in symbols):
+        cached = quote_cache.get(symbol)
+        if cached is not None:
+            results[symbol] = cached
+        else:
+            missing.append(symbol)
+
+    if not missing:
+        return results
+
+    # Worker threads need the app context for the symbols table
+    app = current_app._get_current_object() if has_app_context() else None
+    futures = {lookup_pool.submit(_fetch_in_context, app, symbol): symbol for symbol in missing}
+    done, not_done = wait(futures, timeout=deadline)
+
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            results[futures[future]] = {"error": str(e)}
+    for future in not_done:
+        # Left running on purpose, when it finishes the cache is warm for the next page view
+        results[futures[future]] = {"error": "Quote timed out"}
+
+    return results
+
+
+def price_holdings(user_id, holdings):
+    """Current price for every held symbol, quoted at once; slow or failed quotes use the last trade price."""
+    quotes = lookup_many(holdings)
+    prices = {}
+    for symbol in holdings:
+        quote = quotes.get(symbol)
+        if quote and "price" in quote:
+            prices[symbol] = quote["price"]
+        else:
+            prices[symbol] = Buy.last_price(user_id, symbol)
+    return prices
+
+
+def _fetch_in_context(app, symbol):
+    if app is None:
+        return fetch_and_cache(symbol)
+    with app.app_context():
+        return fetch_and_cache(symbol)
+
+
+def fetch_and_cache(symbol):
+    """Fetch a quote from upstream and remember it if it worked, one fetch per symbol at a time."""
+    # Not in the listing file: a typo, don't spend quota finding that out
+    if symbol_index.known(symbol) is False:
+        metrics.registry.inc("symbol_rejected_total")
+        return {"error": "Invalid symbol or no data available"}
+    return quote_flights.do(symbol.upper(), _fetch_and_cache, symbol)
+
+
+def _fetch_and_cache(symbol):
+    # A fetch that finished just before we got here (here or in another worker) already has it
+    cached = quote_cache.get(symbol)
+    if cached is not None:
+        return cached
+    result = fetch_quote(symbol)
+    if "error" not in result and not result.get("stale"):
+        quote_cache.set(symbol, result)
+    return result
+
+
+def fetch_quote(symbol):
+    """Quote symbol from the first quote provider that answers, else the last price we know."""
+    symbol = symbol.upper()
+    try:
+        quote = quote_providers.quote(symbol)
+    except UnknownSymbol:
+        return {"error": "Invalid symbol or no data available"}
+    except ProviderError as e:
+        # Every provider is down, throttled or over quota: an older price beats no price
+        # (trades check "stale")
+        stale = quote_cache.get_stale(symbol)
+        source = "quote_cache"
+        if stale is None:
+            stale = last_known_price(symbol)
+            source = "last_prices"
+        if stale is not None:
+            metrics.registry.inc("quote_stale_served_total", source=source)
+            return stale
+        return {"error": str(e)}
     except Exception as e:
         return {"error": str(e)}
 
+    save_last_price(quote)
+    return quote
+
+
+def last_known_price(symbol):
+    """The last_prices row for symbol as a stale quote, None if missing or older than LAST_PRICE_MAX_HOURS."""
+    if not has_app_context():
+        return None
+    try:
+        row = db.session.get(LastPrice, symbol)
+    except SQLAlchemyError:
+        # Table missing (migrations not applied yet)
+        db.session.rollback()
+        return None
+    if row is None:
+        return None
+
+    fetched_at = row.fetched_at
+    if fetched_at.tzinfo is None:
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+    age = (datetime.now(timezone.utc) - fetched_at).total_seconds()
+    if age > float(os.environ.get("LAST_PRICE_MAX_HOURS", 168)) * 3600:
+        return None
+    return {"name": row.name or symbol, "price": row.price, "symbol": symbol, "provider": row.provider,
+            "stale": True, "age": round(age, 1)}
+
+
+def save_last_price(quote):
+    """Remember a fresh quote in last_prices, one row per symbol."""
+    if not has_app_context():
+        return
+    values = {
+        "price": quote["price"],
+        "name": quote["name"][:255],
+        "provider": quote.get("provider", "unknown"),
+        "fetched_at": datetime.now(timezone.utc),
+    }
+    try:
+        # Own connection, like save_profile, so the request's session is never committed here
+        with db.engine.begin() as conn:
+            table = LastPrice.__table__
+            updated = conn.execute(
+                table.update().where(table.c.symbol == quote["symbol"]).values(**values)
+            ).rowcount
+            if not updated:
+                conn.execute(table.insert().values(symbol=quote["symbol"], **values))
+    except SQLAlchemyError:
+        # Lost an insert race or the table isn't there yet, the next fetch writes it
+        pass
+
+
+def get_company_name(symbol):
+    """Company name for symbol from the symbols table, refreshed from Finnhub when stale."""
+    profile = load_profile(symbol)
+    if profile is not None:
+        return profile.name
+
+    profile_data = finnhub.client.get("stock/profile2", symbol=symbol)
+
+    company_name = profile_data.get("name")
+    if company_name:
+        save_profile(symbol, profile_data)
+    return company_name
+
+
+def load_profile(symbol):
+    """Return the stored Symbol row if it is younger than SYMBOL_REFRESH_DAYS, else None."""
+    if not has_app_context():
+        return None
+    try:
+        profile = db.session.get(Symbol, symbol)
+    except SQLAlchemyError:
+        # Table missing (migrations not applied yet), just go upstream
+        db.session.rollback()
+        return None
+    if profile is None:
+        return None
+
+    updated_at = profile.updated_at
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    max_age = timedelta(days=float(os.environ.get("SYMBOL_REFRESH_DAYS", 30)))
+    if datetime.now(timezone.utc) - updated_at > max_age:
+        return None
+    return profile
+
+
+def save_profile(symbol, profile_data):
+    """Insert or refresh a symbols row from a Finnhub profile2 payload."""
+    if not has_app_context():
+        return
+    values = {
+        "name": profile_data["name"][:255],
+        "exchange": (profile_data.get("exchange") or "")[:64] or None,
+        "currency": (profile_data.get("currency") or "")[:8] or None,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    try:
+        # Own connection so we never commit half-finished work from the request's session
+        with db.engine.begin() as conn:
+            table = Symbol.__table__
+            updated = conn.execute(
+                table.update().where(table.c.symbol == symbol).values(**values)
+            ).rowcount
+            if not updated:
+                conn.execute(table.insert().values(symbol=symbol, **values))
+    except SQLAlchemyError:
+        # Another worker may have inserted it first, either way the next lookup will find it
+        pass
+
+
+# Finnhub and/or the replay file, in QUOTE_PROVIDERS order (see providers.py)
+quote_providers = ProviderChain.from_env(company_name=get_company_name)
+
+
+def encode_cursor(timestamp, row_id):
+    """Turn a (timestamp, id) keyset position into a URL-safe string."""
+    return f"{timestamp.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor, returns None for anything malformed."""
+    try:
+        timestamp, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
 #This function is credited to my teacher.
 def usd(value):
     """Format value as USD."""
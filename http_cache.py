@@ -0,0 +1,140 @@
+"""
+HTTP caching and compression, decided per response instead of `no-store` on everything.
+
+- Static files: url_for('static', ...) adds ?v=<content hash>. A request carrying the
+  current hash can be cached for a year (`immutable`), since a changed file gets a new
+  URL. Without it, Flask's own no-cache + ETag/Last-Modified revalidation applies.
+- GET pages and API reads: `private, no-cache` plus an ETag, so the browser keeps its
+  copy and a repeat view with nothing new costs a 304 without a body.
+- Anything else (POSTs, redirects, errors, streams, views marked with
+  @cache_policy("no-store")): not stored anywhere, the old behaviour.
+- HTML, JSON and other text bodies of COMPRESS_MIN_SIZE bytes or more are gzipped,
+  or brotli-compressed when the `brotli` package is installed and the browser takes br.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always there
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "private, no-cache"
+NO_STORE = "no-store"
+
+COMPRESSIBLE = {"text/html", "text/css", "text/plain", "text/csv", "application/json",
+                "application/javascript", "text/javascript", "image/svg+xml"}
+
+
+def cache_policy(value):
+    """Decorate a view to give its responses this Cache-Control instead of the default."""
+    def decorator(f):
+        # login_required's @wraps copies the attribute onto its wrapper
+        f.cache_policy = value
+        return f
+    return decorator
+
+
+class StaticFingerprints:
+    """Short content hashes of files in the static folder, recomputed when a file changes."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def get(self, static_folder, filename):
+        path = safe_join(static_folder, filename)
+        if path is None:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._hashes[path] = (mtime, digest)
+        return digest
+
+
+fingerprints = StaticFingerprints()
+
+
+def init_app(app):
+    """Fingerprint static URLs and apply cache headers/compression to every response."""
+    app.config.setdefault("COMPRESS_MIN_SIZE", int(os.environ.get("COMPRESS_MIN_SIZE", 500)))
+    app.config.setdefault("COMPRESS_LEVEL", int(os.environ.get("COMPRESS_LEVEL", 6)))
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            digest = fingerprints.get(app.static_folder, values["filename"])
+            if digest:
+                values["v"] = digest
+
+    app.after_request(finish_response)
+
+
+def finish_response(response):
+    """Cache-Control (+ ETag/304) and compression for one response."""
+    if request.endpoint == "static":
+        version = request.args.get("v")
+        if version and response.status_code == 200 and \
+                version == fingerprints.get(current_app.static_folder, request.view_args["filename"]):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    cacheable = request.method in ("GET", "HEAD") and response.status_code == 200
+    view = current_app.view_functions.get(request.endpoint)
+    # A view's own policy is for its answers, a 401 or 400 cached for minutes would outlive the login or typo
+    policy = getattr(view, "cache_policy", None) if cacheable else NO_STORE
+    if policy is None:
+        policy = REVALIDATE if not response.is_streamed else NO_STORE
+    # A view that set its own header (the SSE stream does) knows best
+    response.headers.setdefault("Cache-Control", policy)
+    if response.headers["Cache-Control"] == NO_STORE:
+        response.headers["Expires"] = 0
+        response.headers["Pragma"] = "no-cache"
+
+    if response.is_streamed or response.direct_passthrough:
+        return response
+
+    if response.headers["Cache-Control"] == REVALIDATE:
+        # Weak: the gzip and plain bodies are the same resource, either may revalidate
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    return compress(response)
+
+
+def compress(response):
+    """br or gzip the body if the client takes it and it is worth it."""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < current_app.config["COMPRESS_MIN_SIZE"]:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=current_app.config["COMPRESS_LEVEL"]))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
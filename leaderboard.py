@@ -0,0 +1,141 @@
+"""
+Trading competition leaderboard: every user ranked by total portfolio value.
+
+A background job (`flask leaderboard run`) values all accounts in one pass:
+
+- every distinct held symbol is quoted once, in a single lookup_many() batch (which
+  serves stale prices while the Finnhub quota is spent). A symbol with no price at all
+  is valued at each holder's average cost
+- the prices go into a temporary table and one query joins users, positions and
+  prices, ranks everyone (ROW_NUMBER, ties go to the older account) and compares the
+  result with the leaderboard table. Only new and changed rows come back out of the
+  database. Transactions are never scanned
+
+Those rows are written in one transaction, so readers always see a complete ranking.
+Ranks are dense 1..n, which makes a user's rank a primary key lookup and a page of
+the board a range scan on the rank index, whatever the number of users.
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import (Column, Float, MetaData, Numeric, String, Table, cast, delete, func, insert, select,
+                        update)
+
+from database import db
+from helpers import lookup_many
+from models import LeaderboardEntry, Position, User
+
+
+def held_symbols():
+    """Every symbol somebody holds right now."""
+    return set(db.session.execute(select(Position.symbol).where(Position.shares > 0).distinct()).scalars())
+
+
+def quote_symbols(symbols, deadline=30.0):
+    """{symbol: price} in one batch, symbols without a usable quote are left out."""
+    quotes = lookup_many(symbols, deadline=deadline) if symbols else {}
+    return {symbol: quote["price"] for symbol, quote in quotes.items() if "price" in quote}
+
+
+@contextmanager
+def price_table(prices):
+    """A temporary (symbol, price) table on the session's connection, dropped afterwards."""
+    conn = db.session.connection()
+    table = Table("leaderboard_prices", MetaData(), Column("symbol", String(10), primary_key=True),
+                  Column("price", Float, nullable=False), prefixes=["TEMPORARY"])
+    table.create(conn)
+    try:
+        if prices:
+            conn.execute(insert(table), [{"symbol": symbol, "price": price} for symbol, price in prices.items()])
+        yield table
+    finally:
+        table.drop(conn)
+
+
+def changed_standings(prices):
+    """Select (user_id, rank, value, cash, holdings_value, is_new) for every row that needs writing."""
+    price = func.coalesce(prices.c.price, Position.cost_basis / Position.shares)
+    held = (select(Position.user_id, func.sum(Position.shares * price).label("value"))
+            .outerjoin(prices, prices.c.symbol == Position.symbol)
+            .where(Position.shares > 0)
+            .group_by(Position.user_id)
+            .subquery())
+
+    # Rounded to cents before ranking, so float noise never reorders equal accounts.
+    # Postgres only rounds numerics, hence the cast.
+    holdings = func.coalesce(held.c.value, 0.0)
+    value = func.round(cast(User.cash + holdings, Numeric), 2)
+    ranked = (select(User.id.label("user_id"),
+                     func.row_number().over(order_by=(value.desc(), User.id)).label("rank"),
+                     value.label("value"),
+                     func.round(cast(User.cash, Numeric), 2).label("cash"),
+                     func.round(cast(holdings, Numeric), 2).label("holdings_value"))
+              .outerjoin(held, held.c.user_id == User.id)
+              .subquery())
+
+    current = LeaderboardEntry.__table__
+    return (select(ranked, current.c.user_id.is_(None).label("is_new"))
+            .outerjoin(current, current.c.user_id == ranked.c.user_id)
+            .where(current.c.user_id.is_(None)
+                   | (current.c.rank != ranked.c.rank)
+                   | (current.c.value != ranked.c.value)
+                   # Cash and holdings can trade places with the total unchanged, both are shown
+                   | (current.c.cash != ranked.c.cash)
+                   | (current.c.holdings_value != ranked.c.holdings_value)))
+
+
+class LeaderboardJob:
+    """Recomputes the ranking and writes the difference to the leaderboard table."""
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def refresh(self, prices=None):
+        """One valuation pass. Returns (rows written, symbols priced)."""
+        symbols = held_symbols()
+        if prices is None:
+            prices = quote_symbols(symbols)
+        prices = {symbol: price for symbol, price in prices.items() if symbol in symbols}
+
+        now = datetime.now(timezone.utc)
+        inserts, updates = [], []
+        with price_table(prices) as table:
+            for user_id, rank, value, cash, held, is_new in db.session.execute(changed_standings(table)):
+                row = {"user_id": user_id, "rank": rank, "value": float(value), "cash": float(cash),
+                       "holdings_value": float(held), "updated_at": now}
+                (inserts if is_new else updates).append(row)
+
+        # Accounts that no longer exist drop off the board
+        removed = db.session.execute(
+            delete(LeaderboardEntry).where(LeaderboardEntry.user_id.not_in(select(User.id)))
+        ).rowcount
+        if updates:
+            db.session.execute(update(LeaderboardEntry), updates)
+        if inserts:
+            db.session.execute(insert(LeaderboardEntry), inserts)
+        db.session.commit()
+        return len(inserts) + len(updates) + removed, len(prices)
+
+    def run(self):
+        """Refresh forever (the `flask leaderboard run` process)."""
+        with self.app.app_context():
+            self.app.logger.info(f"🏆 Leaderboard job started, refreshing every {self.interval:g}s")
+            while True:
+                started = time.monotonic()
+                try:
+                    written, priced = self.refresh()
+                    self.app.logger.info(f"🏆 Leaderboard refreshed in {time.monotonic() - started:.2f}s: "
+                                         f"{written} rows changed, {priced} symbols priced")
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.warning(f"⚠️  Leaderboard refresh failed: {e}")
+                time.sleep(max(self.interval - (time.monotonic() - started), 1.0))
+
+
+job = LeaderboardJob(interval=float(os.environ.get("LEADERBOARD_INTERVAL", 60)))
@@ -0,0 +1,160 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Buy, Position, User, apply_trade
+
+
+class LedgerError(Exception):
+    """Base class for trades the ledger refuses to record."""
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class InsufficientShares(LedgerError):
+    pass
+
+
+def record_buy(user_id, symbol, shares, price, commit=True):
+    """
+    Debit cash, credit the position and write the Buy row.
+
+    The cash check and the debit are one conditional UPDATE, so two workers racing on
+    the same account can't both spend the same dollars. Lock order is always
+    users -> positions to keep Postgres from deadlocking buys against sells.
+    """
+    symbol = symbol.upper()
+    price = float(price)
+    cost = shares * price
+
+    debited = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.cash >= cost)
+        .values(cash=User.cash - cost, ledger_version=User.ledger_version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if debited != 1:
+        db.session.rollback()
+        raise InsufficientFunds("Insufficient funds")
+
+    _credit_position(user_id, symbol, shares, cost)
+    return _finish(user_id, symbol, shares, price, commit)
+
+
+def record_sell(user_id, symbol, shares, price, commit=True):
+    """Credit cash, debit the position (only if enough shares are held) and write the Buy row."""
+    symbol = symbol.upper()
+    price = float(price)
+
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(cash=User.cash + shares * price, ledger_version=User.ledger_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    debited = db.session.execute(
+        update(Position)
+        .where(Position.user_id == user_id, Position.symbol == symbol, Position.shares >= shares)
+        .values(
+            shares=Position.shares - shares,
+            # Average cost: what is left keeps its share of the basis
+            cost_basis=case(
+                (Position.shares == shares, 0.0),
+                else_=Position.cost_basis * (Position.shares - shares) / Position.shares,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if debited != 1:
+        db.session.rollback()
+        raise InsufficientShares("Not enough shares")
+
+    return _finish(user_id, symbol, -shares, price, commit)
+
+
+def record_basket(user_id, legs):
+    """
+    Record many trades as one all-or-nothing transaction.
+
+    `legs` is a list of (symbol, shares, price) with negative shares for sells. Cash is
+    checked against the net of the whole basket (sales fund the buys), holdings are
+    checked leg by leg in order. One UPDATE for cash, one SELECT for positions, bulk
+    writes for positions and transactions, one commit.
+    """
+    legs = [(symbol.upper(), int(shares), float(price)) for symbol, shares, price in legs]
+    net_cash = -sum(shares * price for _, shares, price in legs)
+
+    # Taking the users row first serializes this against every other trade on the account
+    # (they all start there too), so the positions read below can't change under us
+    debited = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.cash + net_cash >= 0)
+        .values(cash=User.cash + net_cash, ledger_version=User.ledger_version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if debited != 1:
+        db.session.rollback()
+        raise InsufficientFunds("Insufficient funds")
+
+    symbols = {symbol for symbol, _, _ in legs}
+    held = {row.symbol: (row.shares, row.cost_basis) for row in db.session.execute(
+        select(Position.symbol, Position.shares, Position.cost_basis)
+        .where(Position.user_id == user_id, Position.symbol.in_(symbols)))}
+    existing = set(held)
+
+    for symbol, shares, price in legs:
+        shares_held, cost_basis = held.get(symbol, (0, 0.0))
+        if shares_held + shares < 0:
+            db.session.rollback()
+            raise InsufficientShares(f"Not enough shares of {symbol}")
+        held[symbol] = apply_trade(shares_held, cost_basis, shares, price)
+
+    rows = [{"user_id": user_id, "symbol": symbol, "shares": shares, "cost_basis": cost_basis}
+            for symbol, (shares, cost_basis) in held.items()]
+    updates = [row for row in rows if row["symbol"] in existing]
+    inserts = [row for row in rows if row["symbol"] not in existing]
+    if updates:
+        db.session.execute(update(Position), updates)
+    if inserts:
+        db.session.execute(insert(Position), inserts)
+
+    # One timestamp for the whole basket, the id keeps the legs in order in history
+    now = datetime.now(timezone.utc)
+    db.session.execute(insert(Buy), [
+        {"user_id": user_id, "symbol": symbol, "shares": shares, "price": price, "timestamp": now}
+        for symbol, shares, price in legs
+    ])
+    db.session.commit()
+    return legs
+
+
+def _credit_position(user_id, symbol, shares, cost):
+    credit = (
+        update(Position)
+        .where(Position.user_id == user_id, Position.symbol == symbol)
+        .values(shares=Position.shares + shares, cost_basis=Position.cost_basis + cost)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(credit).rowcount:
+        return
+
+    # First time this user holds the symbol. If another worker inserts the row
+    # between our UPDATE and INSERT, the savepoint lets us fall back to the UPDATE.
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Position).values(
+                user_id=user_id, symbol=symbol, shares=shares, cost_basis=cost))
+    except IntegrityError:
+        db.session.execute(credit)
+
+
+def _finish(user_id, symbol, shares, price, commit):
+    trade = Buy(user_id=user_id, symbol=symbol, shares=shares, price=price)
+    db.session.add(trade)
+    if commit:
+        db.session.commit()
+    return trade
@@ -0,0 +1,202 @@
+"""
+Trigger engine for resting limit and stop orders.
+
+Every symbol keeps two heaps of open orders:
+
+- rising: sell limits and buy stops, fire once the price climbs to the trigger (min-heap)
+- falling: buy limits and sell stops, fire once the price drops to the trigger (max-heap)
+
+A tick only pops what the new price crossed, so the cost is the number of fills
+(times log n), not the number of resting orders. Orders at the same trigger fill
+oldest first.
+
+Fills go through ledger.py like market orders do. The order row is claimed with a
+conditional UPDATE in the same transaction, so an order cancelled in the meantime
+(or a second engine running by mistake) can never fill twice.
+
+Run it as its own process: `flask orders engine`.
+"""
+import heapq
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from sqlalchemy import select, update
+
+from database import db
+from helpers import lookup_many
+from ledger import LedgerError, record_buy, record_sell
+from models import RestingOrder
+
+
+class Resting(NamedTuple):
+    """What the engine remembers about an open order"""
+    user_id: int
+    symbol: str
+    side: str
+    shares: int
+    trigger: float
+    fires_on_rise: bool
+
+
+class TriggerBook:
+    """Open orders per symbol in two heaps keyed on trigger price."""
+
+    def __init__(self):
+        self._rising = defaultdict(list)   # symbol -> [(trigger, id, order)]
+        self._falling = defaultdict(list)  # symbol -> [(-trigger, id, order)]
+        self._ids = set()
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, order_id):
+        return order_id in self._ids
+
+    def add(self, order_id, order):
+        """Rest a Resting order until a price crosses its trigger."""
+        if order.fires_on_rise:
+            heapq.heappush(self._rising[order.symbol], (order.trigger, order_id, order))
+        else:
+            heapq.heappush(self._falling[order.symbol], (-order.trigger, order_id, order))
+        self._ids.add(order_id)
+        self.max_id = max(self.max_id, order_id)
+
+    def crossed(self, symbol, price):
+        """Pop and return (id, order) for every order the price has reached, oldest first per trigger."""
+        fired = []
+        rising = self._rising.get(symbol)
+        while rising and rising[0][0] <= price:
+            _, order_id, order = heapq.heappop(rising)
+            fired.append((order_id, order))
+        falling = self._falling.get(symbol)
+        while falling and -falling[0][0] >= price:
+            _, order_id, order = heapq.heappop(falling)
+            fired.append((order_id, order))
+
+        if fired:
+            self._ids.difference_update(order_id for order_id, _ in fired)
+            # Don't keep empty heaps around, symbols() is what gets quoted every tick
+            if not rising:
+                self._rising.pop(symbol, None)
+            if not falling:
+                self._falling.pop(symbol, None)
+        return fired
+
+    def symbols(self):
+        """Symbols with at least one resting order."""
+        return self._rising.keys() | self._falling.keys()
+
+
+class MatchingEngine:
+    """Keeps a TriggerBook in step with the orders table and fills what each tick crosses."""
+
+    def __init__(self, interval=5, rescan_every=12):
+        self.interval = interval
+        self.rescan_every = rescan_every
+        self.app = None
+        self.book = TriggerBook()
+        self._syncs = 0
+
+    def init_app(self, app):
+        self.app = app
+
+    def sync(self, full=False):
+        """
+        Pick up orders placed since the last sync (cancellations are caught when they fire).
+
+        Usually that is every open order above the highest id in the book. Ids are handed
+        out before commit though, so on Postgres a lower id can commit after a higher one
+        was synced and the watermark would skip it for good. Every rescan_every-th sync
+        (or with full=True) reads all open orders and adds whatever the book is missing.
+        """
+        self._syncs += 1
+        query = (select(RestingOrder.id, RestingOrder.user_id, RestingOrder.symbol, RestingOrder.side,
+                        RestingOrder.order_type, RestingOrder.shares, RestingOrder.trigger_price)
+                 .where(RestingOrder.status == "open"))
+        if not full and self._syncs % self.rescan_every:
+            query = query.where(RestingOrder.id > self.book.max_id)
+        rows = db.session.execute(query.order_by(RestingOrder.id).execution_options(yield_per=10000))
+        added = 0
+        for row in rows:
+            if row.id in self.book:
+                continue
+            fires_on_rise = (row.side == "sell") == (row.order_type == "limit")
+            self.book.add(row.id, Resting(row.user_id, row.symbol, row.side, row.shares,
+                                          row.trigger_price, fires_on_rise))
+            added += 1
+        db.session.rollback()  # end the read transaction
+        return added
+
+    def tick(self, prices=None):
+        """Sync, quote every symbol with resting orders and fill what crossed. Returns fills."""
+        self.sync()
+        if prices is None:
+            quotes = lookup_many(self.book.symbols())
+            # Never fill on a stale (rate limited) price, those orders wait for the next tick
+            prices = {symbol: quote["price"] for symbol, quote in quotes.items()
+                      if "price" in quote and not quote.get("stale")}
+
+        filled = 0
+        for symbol, price in prices.items():
+            for order_id, order in self.book.crossed(symbol, price):
+                try:
+                    filled += self.fill(order_id, order, price)
+                except Exception as e:
+                    # Database trouble, not the order's fault: put it back and retry next tick
+                    db.session.rollback()
+                    self.app.logger.warning(f"⚠️  Fill of order {order_id} failed, will retry: {e}")
+                    self.book.add(order_id, order)
+        return filled
+
+    def fill(self, order_id, order, price):
+        """Claim the order and trade it through the ledger in one transaction. True if it filled."""
+        now = datetime.now(timezone.utc)
+        claimed = db.session.execute(
+            update(RestingOrder)
+            .where(RestingOrder.id == order_id, RestingOrder.status == "open")
+            .values(status="filled", closed_at=now, fill_price=price)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()  # cancelled (or filled) since we loaded it
+            return False
+
+        trade = record_buy if order.side == "buy" else record_sell
+        try:
+            trade(order.user_id, order.symbol, order.shares, price, commit=False)
+        except LedgerError as e:
+            # The ledger rolled the claim back too, record why the order died
+            db.session.execute(
+                update(RestingOrder)
+                .where(RestingOrder.id == order_id, RestingOrder.status == "open")
+                .values(status="rejected", closed_at=now, reason=str(e))
+                .execution_options(synchronize_session=False))
+            db.session.commit()
+            self.app.logger.info(f"🚫 Order {order_id} rejected: {e}")
+            return False
+
+        db.session.commit()
+        self.app.logger.info(
+            f"✅ Order {order_id} filled: {order.side} {order.shares} {order.symbol} at ${price:.2f}")
+        return True
+
+    def run(self):
+        """Tick forever (the `flask orders engine` process)."""
+        with self.app.app_context():
+            self.app.logger.info(f"⚙️  Matching engine started, {self.sync()} open orders")
+            while True:
+                started = time.monotonic()
+                try:
+                    self.tick()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.warning(f"⚠️  Matching tick failed: {e}")
+                time.sleep(max(self.interval - (time.monotonic() - started), 0.1))
+
+
+engine = MatchingEngine(interval=float(os.environ.get("MATCHING_INTERVAL", 5)),
+                        rescan_every=max(int(os.environ.get("MATCHING_RESCAN_EVERY", 12)), 1))
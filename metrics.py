@@ -0,0 +1,312 @@
+"""
+Request instrumentation and a Prometheus text endpoint (/metrics).
+
+Every request records its total time plus how much of it went to SQL, quote lookups
+and template rendering:
+
+- SQL: SQLAlchemy before/after_cursor_execute events on every engine
+- quotes: helpers.lookup / lookup_many wrap themselves in `timed("quote")`
+- render: Flask's before_render_template / template_rendered signals
+
+Those land in counters and histograms here, in a Server-Timing response header (so
+the browser devtools show the breakdown) and, for requests slower than
+SLOW_REQUEST_MS, in a log line.
+
+Gunicorn workers each keep their own numbers. With METRICS_DIR set, every worker
+snapshots its registry to METRICS_DIR/metrics-<pid>-<start>.json (at most once per
+METRICS_FLUSH_INTERVAL seconds) and /metrics adds up all the files, so any worker
+can answer a scrape with the totals. Files of dead workers are kept on purpose, so
+counters never go backwards. gunicorn.conf.py empties the directory when the master
+starts.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import (Response, abort, before_render_template, current_app, g, has_request_context,
+                   request, template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "http_requests_total": ("counter", "Requests handled, by endpoint, method and status"),
+    "http_request_duration_seconds": ("histogram", "Time to produce the response (not to stream the body)"),
+    "http_request_sql_queries_total": ("counter", "SQL statements run while handling requests"),
+    "http_request_sql_seconds_total": ("counter", "Time spent in SQL while handling requests"),
+    "http_request_quote_seconds_total": ("counter", "Time spent waiting on quote lookups while handling requests"),
+    "http_request_render_seconds_total": ("counter", "Time spent rendering templates while handling requests"),
+    "sql_query_duration_seconds": ("histogram", "Every SQL statement, requests and background work alike"),
+    "quote_lookup_duration_seconds": ("histogram", "lookup()/lookup_many() calls, by source"),
+    "finnhub_request_duration_seconds": ("histogram", "Upstream Finnhub HTTP calls, by endpoint and outcome"),
+    "finnhub_rate_limited_total": ("counter", "Finnhub calls refused locally because the quota was used up"),
+    "quote_stale_served_total": ("counter", "Expired quotes served because upstream couldn't be asked"),
+    "quote_provider_failures_total": ("counter", "Quote provider calls that failed, by provider"),
+    "quote_hedged_total": ("counter", "Lookups that also asked the next provider because the current one was slow"),
+    "symbol_rejected_total": ("counter", "Lookups of tickers missing from the listing file, answered locally"),
+}
+
+
+class Registry:
+    """Counters and histograms keyed by (name, labels), safe to update from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Per-bucket counts (not cumulative) + sum + count
+            slots = self.histograms.get(key)
+            if slots is None:
+                slots = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    slots[i] += 1
+                    break
+            else:
+                slots[len(BUCKETS)] += 1
+            slots[-2] += seconds
+            slots[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, dict(labels), list(slots)]
+                               for (name, labels), slots in self.histograms.items()],
+            }
+
+
+def merge(snapshots):
+    """Add several registry snapshots together (one per worker)."""
+    total = Registry()
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get("counters", []):
+            total.inc(name, value, **labels)
+        for name, labels, slots in snapshot.get("histograms", []):
+            key = (name, tuple(sorted(labels.items())))
+            current = total.histograms.setdefault(key, [0] * len(slots))
+            for i, value in enumerate(slots):
+                current[i] += value
+    return total
+
+
+def render(registry):
+    """Prometheus text exposition format."""
+    lines = []
+    by_name = {}
+    for (name, labels), value in registry.counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), slots in registry.histograms.items():
+        by_name.setdefault(name, []).append((labels, slots))
+
+    for name in sorted(by_name):
+        kind, help_text = METRICS.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+                continue
+            cumulative = 0
+            bounds = [f"{bound:g}" for bound in BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, value[:len(bounds)]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {value[-2]:g}")
+            lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """Wires the registry into Flask, SQLAlchemy and the quote helpers."""
+
+    def __init__(self):
+        self.registry = Registry()
+        self.directory = None
+        self.flush_interval = 1.0
+        self.slow_ms = 0.0
+        self.token = None
+        self._pid = os.getpid()
+        self._started = time.time_ns()
+        self._flushed = 0.0
+        self._flush_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.directory = os.environ.get("METRICS_DIR") or None
+        self.flush_interval = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+        self.slow_ms = float(os.environ.get("SLOW_REQUEST_MS", 0))
+        self.token = os.environ.get("METRICS_TOKEN") or None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._start_render, app)
+        template_rendered.connect(self._finish_render, app)
+        # Engine-class listeners cover the app engine and any engine created later
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        app.add_url_rule("/metrics", "metrics", self.endpoint)
+
+    # --- per-request bookkeeping ---
+
+    def _start_request(self):
+        self._check_fork()
+        g.metrics = {"started": time.perf_counter(), "sql": 0.0, "sql_count": 0, "quote": 0.0,
+                     "quote_count": 0, "render": 0.0}
+
+    def _finish_request(self, response):
+        phases = g.pop("metrics", None)
+        if phases is None:
+            return response
+        elapsed = time.perf_counter() - phases["started"]
+        endpoint = request.endpoint or "unmatched"
+        if endpoint == "metrics":
+            return response
+
+        labels = {"endpoint": endpoint, "method": request.method}
+        self.registry.inc("http_requests_total", status=str(response.status_code), **labels)
+        self.registry.observe("http_request_duration_seconds", elapsed, **labels)
+        self.registry.inc("http_request_sql_queries_total", phases["sql_count"], **labels)
+        self.registry.inc("http_request_sql_seconds_total", phases["sql"], **labels)
+        self.registry.inc("http_request_quote_seconds_total", phases["quote"], **labels)
+        self.registry.inc("http_request_render_seconds_total", phases["render"], **labels)
+
+        other = max(elapsed - phases["sql"] - phases["quote"] - phases["render"], 0.0)
+        response.headers["Server-Timing"] = ", ".join([
+            f"sql;dur={phases['sql'] * 1000:.1f};desc=\"{phases['sql_count']} queries\"",
+            f"quote;dur={phases['quote'] * 1000:.1f}",
+            f"render;dur={phases['render'] * 1000:.1f}",
+            f"app;dur={other * 1000:.1f}",
+            f"total;dur={elapsed * 1000:.1f}",
+        ])
+
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            current_app.logger.warning(
+                f"🐢 Slow request {request.method} {request.path} {response.status_code} "
+                f"{elapsed * 1000:.0f} ms: sql {phases['sql'] * 1000:.0f} ms "
+                f"({phases['sql_count']} queries), quotes {phases['quote'] * 1000:.0f} ms "
+                f"({phases['quote_count']} lookups), render {phases['render'] * 1000:.0f} ms, "
+                f"other {other * 1000:.0f} ms")
+
+        self.maybe_flush()
+        return response
+
+    def _start_render(self, sender, template, context, **extra):
+        if has_request_context() and "metrics" in g:
+            g.metrics.setdefault("render_started", []).append(time.perf_counter())
+
+    def _finish_render(self, sender, template, context, **extra):
+        if has_request_context() and "metrics" in g and g.metrics.get("render_started"):
+            g.metrics["render"] += time.perf_counter() - g.metrics["render_started"].pop()
+
+    # --- multi-worker snapshots ---
+
+    def maybe_flush(self, force=False):
+        """Write this worker's snapshot to METRICS_DIR, at most every flush_interval seconds."""
+        if not self.directory:
+            return
+        self._check_fork()
+        now = time.monotonic()
+        if not force and now - self._flushed < self.flush_interval:
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return  # another thread of this worker is already writing
+        try:
+            self._flushed = now
+            path = os.path.join(self.directory, f"metrics-{self._pid}-{self._started}.json")
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.registry.snapshot(), f)
+            os.replace(tmp, path)  # readers never see a half-written file
+        finally:
+            self._flush_lock.release()
+
+    def _check_fork(self):
+        # Counts copied from the parent belong to the parent's file, start clean
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._started = time.time_ns()
+            self.registry = Registry()
+
+    def collect(self):
+        """Totals across every worker (or just this process without METRICS_DIR)."""
+        if not self.directory:
+            return self.registry
+        self.maybe_flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # removed or replaced while we were reading
+        return merge(snapshots)
+
+    def endpoint(self):
+        """GET /metrics"""
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+            abort(401)
+        return Response(render(self.collect()), mimetype="text/plain; version=0.0.4")
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def timed(kind, **labels):
+    """Time a block into quote_lookup_duration_seconds and the current request's breakdown."""
+    started = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.registry.observe("quote_lookup_duration_seconds", elapsed, **labels)
+        if has_request_context() and "metrics" in g:
+            g.metrics[kind] += elapsed
+            g.metrics[f"{kind}_count"] += 1
+
+
+def observe_upstream(endpoint, outcome, seconds):
+    metrics.registry.observe("finnhub_request_duration_seconds", seconds,
+                             endpoint=endpoint, outcome=outcome)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context rather than the pooled connection: a statement that fails
+    # never reaches after_cursor_execute, and its start time goes away with its context
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    metrics.registry.observe("sql_query_duration_seconds", elapsed)
+    if has_request_context() and "metrics" in g:
+        g.metrics["sql"] += elapsed
+        g.metrics["sql_count"] += 1
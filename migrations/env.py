@@ -11,7 +11,11 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# Keep the app's loggers alive when migrations run inside the app process, and
+# stop the app logger from printing everything twice through the root handler
+fileConfig(config.config_file_name, disable_existing_loggers=False)
+if current_app.logger.handlers:
+    current_app.logger.propagate = False
 logger = logging.getLogger('alembic.env')
 
 
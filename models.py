@@ -1,6 +1,6 @@
 from database import db
 from datetime import datetime, timezone
-from sqlalchemy import text
+from sqlalchemy import and_, func, or_, text
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -10,6 +10,8 @@ class User(db.Model):
     hash = db.Column(db.String(512), nullable=False)
     # Use both server_default (for database) and default (for SQLAlchemy) for maximum reliability
     cash = db.Column(db.Float, nullable=False, server_default=text("10000.00"), default=10000.00)
+    # Bumped by every ledger write, cached fragments of the user's tables are keyed on it
+    ledger_version = db.Column(db.Integer, nullable=False, server_default=text("0"), default=0)
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
@@ -24,5 +26,184 @@ class Buy(db.Model):
     price = db.Column(db.Numeric, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
 
+    # Every portfolio read filters on user_id first, so these keep it to the user's own rows
+    __table_args__ = (
+        db.Index('ix_transactions_user_id_symbol', 'user_id', 'symbol'),
+        db.Index('ix_transactions_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
     def __repr__(self):
         return '<Buy {}>'.format(self.id)
+
+    @classmethod
+    def history_page(cls, user_id, limit, before=None, after=None):
+        """
+        One keyset page of the user's history, newest first.
+
+        `before`/`after` are (timestamp, id) positions. Returns (rows, has_older, has_newer).
+        """
+        query = cls.query.filter_by(user_id=user_id)
+        if after:
+            # Walking back towards newer rows: read ascending, then flip for display
+            timestamp, row_id = after
+            query = query.filter(or_(cls.timestamp > timestamp,
+                                     and_(cls.timestamp == timestamp, cls.id > row_id)))
+            rows = query.order_by(cls.timestamp.asc(), cls.id.asc()).limit(limit + 1).all()
+            return list(reversed(rows[:limit])), True, len(rows) > limit
+
+        if before:
+            timestamp, row_id = before
+            query = query.filter(or_(cls.timestamp < timestamp,
+                                     and_(cls.timestamp == timestamp, cls.id < row_id)))
+        rows = query.order_by(cls.timestamp.desc(), cls.id.desc()).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit, before is not None
+
+    @classmethod
+    def last_price(cls, user_id, symbol):
+        """Price of the user's most recent trade in symbol, or None"""
+        price = (db.session.query(cls.price)
+                 .filter(cls.user_id == user_id, cls.symbol == symbol)
+                 .order_by(cls.timestamp.desc(), cls.id.desc())
+                 .limit(1)
+                 .scalar())
+        return float(price) if price is not None else None
+
+class Symbol(db.Model):
+    __tablename__ = 'symbols'
+    """Company profile data from Finnhub, cached because it almost never changes"""
+    symbol = db.Column(db.String(10), primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    exchange = db.Column(db.String(64))
+    currency = db.Column(db.String(8))
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return '<Symbol {}>'.format(self.symbol)
+
+class LastPrice(db.Model):
+    __tablename__ = 'last_prices'
+    """Last good quote per symbol, what reads fall back to while every quote provider is down"""
+    symbol = db.Column(db.String(10), primary_key=True)
+    price = db.Column(db.Float, nullable=False)
+    name = db.Column(db.String(255))
+    provider = db.Column(db.String(32), nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return '<LastPrice {} {}>'.format(self.symbol, self.price)
+
+class SessionRecord(db.Model):
+    __tablename__ = 'sessions'
+    """Server-side sessions (SESSION_BACKEND=sqlalchemy), the columns Flask-Session reads and writes"""
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(255), unique=True)
+    data = db.Column(db.LargeBinary)
+    expiry = db.Column(db.DateTime)
+
+    def __init__(self, session_id, data, expiry):
+        self.session_id = session_id
+        self.data = data
+        self.expiry = expiry
+
+    def __repr__(self):
+        return '<SessionRecord {}>'.format(self.id)
+
+class Position(db.Model):
+    __tablename__ = 'positions'
+    """Running share count and cost basis per user and symbol, only written through ledger.py"""
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    symbol = db.Column(db.String(5), primary_key=True)
+    shares = db.Column(db.Integer, nullable=False, default=0)
+    cost_basis = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return '<Position {} {}>'.format(self.user_id, self.symbol)
+
+    @classmethod
+    def holdings(cls, user_id):
+        """Shares held per symbol, straight from the positions table"""
+        rows = (db.session.query(cls.symbol, cls.shares)
+                .filter(cls.user_id == user_id, cls.shares > 0)
+                .order_by(cls.symbol)
+                .all())
+        return {symbol: shares for symbol, shares in rows}
+
+    @classmethod
+    def shares_owned(cls, user_id, symbol):
+        """Shares of one symbol the user holds right now"""
+        position = db.session.get(cls, (user_id, symbol))
+        return position.shares if position else 0
+
+
+class RestingOrder(db.Model):
+    __tablename__ = 'orders'
+    """Limit and stop orders waiting for their trigger price, filled by matching.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    symbol = db.Column(db.String(5), nullable=False)
+    side = db.Column(db.String(4), nullable=False)         # buy / sell
+    order_type = db.Column(db.String(5), nullable=False)   # limit / stop
+    shares = db.Column(db.Integer, nullable=False)
+    trigger_price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(9), nullable=False, default='open')  # open / filled / cancelled / rejected
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    closed_at = db.Column(db.DateTime)
+    fill_price = db.Column(db.Float)
+    reason = db.Column(db.String(64))
+
+    # The engine loads open orders by id, users list their own
+    __table_args__ = (
+        db.Index('ix_orders_status_id', 'status', 'id'),
+        db.Index('ix_orders_user_id_status', 'user_id', 'status'),
+    )
+
+    def __repr__(self):
+        return '<RestingOrder {} {} {} {}@{}>'.format(
+            self.id, self.side, self.order_type, self.symbol, self.trigger_price)
+
+    @property
+    def fires_on_rise(self):
+        """Sell limits and buy stops trigger when the price climbs to the trigger, the rest when it falls"""
+        return (self.side == 'sell') == (self.order_type == 'limit')
+
+class LeaderboardEntry(db.Model):
+    __tablename__ = 'leaderboard'
+    """One row per ranked user, rewritten (only where it changed) by leaderboard.py"""
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    rank = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    cash = db.Column(db.Float, nullable=False)
+    holdings_value = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    # Ranks are dense (1..n), so a page of the board is a range scan on this index
+    __table_args__ = (
+        db.Index('ix_leaderboard_rank', 'rank'),
+    )
+
+    def __repr__(self):
+        return '<LeaderboardEntry #{} user {}>'.format(self.rank, self.user_id)
+
+    @classmethod
+    def page(cls, page, per_page):
+        """(entry, username) rows for one page of the board, best first"""
+        first = (page - 1) * per_page
+        return (db.session.query(cls, User.username)
+                .join(User, User.id == cls.user_id)
+                .filter(cls.rank > first, cls.rank <= first + per_page)
+                .order_by(cls.rank)
+                .all())
+
+    @classmethod
+    def total(cls):
+        """How many users are on the board (the last rank, read off the index)"""
+        return db.session.query(func.coalesce(func.max(cls.rank), 0)).scalar()
+
+def apply_trade(held, cost_basis, shares, price):
+    """Average-cost bookkeeping: buys add their cost, sells remove the average cost of what left"""
+    if shares >= 0:
+        return held + shares, cost_basis + shares * float(price)
+    remaining = held + shares
+    if remaining <= 0:
+        return remaining, 0.0
+    return remaining, cost_basis * remaining / held
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+from helpers import lookup_many
+
+
+class Subscription:
+    """One browser tab listening for price changes on a set of symbols."""
+
+    def __init__(self, symbols):
+        self.symbols = set(symbols)
+        # Symbols it has had a price for, until then it gets the price whether it moved or not
+        self.sent = set()
+        self._pending = {}
+        self._changed = threading.Condition()
+
+    def push(self, prices):
+        """Merge new prices in, so a slow reader gets the latest value instead of a backlog."""
+        with self._changed:
+            self._pending.update(prices)
+            self._changed.notify()
+
+    def wait(self, timeout):
+        """Block until prices arrive (or timeout) and return them, {} on timeout."""
+        with self._changed:
+            if not self._pending:
+                self._changed.wait(timeout)
+            prices, self._pending = self._pending, {}
+            return prices
+
+
+class PriceFeed:
+    """
+    Polls every symbol anyone is watching once per interval and fans the changes out.
+
+    Ten tabs watching AAPL cost one AAPL quote per tick, not ten.
+
+    Every open stream holds a gthread worker thread for as long as its tab is open
+    (EventSource reconnects as soon as one ends), so at most max_streams of them run per
+    worker. The other threads stay free for logins, trades and the API.
+    """
+
+    def __init__(self, interval=5, max_streams=4):
+        self.interval = interval
+        self.max_streams = max_streams
+        self.app = None
+        self.last_prices = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._streams = 0
+
+    def init_app(self, app):
+        self.app = app
+
+    def claim_stream(self):
+        """Take one of this worker's stream slots, False when they are all in use."""
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def release_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"streams": self._streams, "max_streams": self.max_streams,
+                    "subscribers": len(self._subscribers)}
+
+    def subscribe(self, symbols):
+        subscription = Subscription(symbols)
+        with self._lock:
+            self._subscribers.add(subscription)
+        self._ensure_running()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def tick(self):
+        """
+        Quote every watched symbol once and push what changed to its subscribers.
+
+        A subscriber gets the first price quoted for each of its symbols even if it didn't
+        move: the page it came from may have shown a fallback (the last trade price), and a
+        quote that failed on one tick must still reach it on the next.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        symbols = set().union(*(s.symbols for s in subscribers)) if subscribers else set()
+        if not symbols:
+            return {}
+
+        with self.app.app_context():
+            quotes = lookup_many(symbols)
+
+        quoted = {symbol: quote["price"] for symbol, quote in quotes.items() if "price" in quote}
+        changed = {symbol: price for symbol, price in quoted.items() if self.last_prices.get(symbol) != price}
+        self.last_prices.update(changed)
+
+        for subscription in subscribers:
+            prices = {s: p for s, p in quoted.items()
+                      if s in subscription.symbols and (s in changed or s not in subscription.sent)}
+            if prices:
+                subscription.sent.update(prices)
+                subscription.push(prices)
+        return changed
+
+    def _ensure_running(self):
+        # One loop per worker process, started on first use (threads don't survive fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.last_prices = {}
+            threading.Thread(target=self._run, name="price-feed", daemon=True).start()
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                self.app.logger.warning(f"⚠️  Price feed tick failed: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0.1))
+
+
+# Half the gunicorn threads by default, see README "Live Updates and Threads"
+feed = PriceFeed(interval=float(os.environ.get("PRICE_FEED_INTERVAL", 5)),
+                 max_streams=int(os.environ.get("SSE_MAX_STREAMS",
+                                                max(int(os.environ.get("GUNICORN_THREADS", 8)) // 2, 1))))
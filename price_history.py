@@ -0,0 +1,176 @@
+"""
+Append-only, columnar price history (OHLCV bars) on disk, read with numpy.memmap.
+
+Each symbol is a directory with one fixed-width little-endian file per column:
+
+    price_history/AAPL/timestamp.i8   unix seconds, ascending
+    price_history/AAPL/open.f8  high.f8  low.f8  close.f8
+    price_history/AAPL/volume.i8
+
+Bar i lives at byte i * itemsize in every file, so a time range is a binary search
+on the timestamp column plus plain slices of the other columns. Slices of a memmap
+are views: nothing is read until it's touched, and the OS page cache is shared by
+every worker.
+
+One writer at a time (the `flask prices ingest` command). Appends write the value
+columns first and the timestamp column last, and readers size everything from the
+timestamp file, so a reader never sees a half-written bar.
+"""
+import os
+import re
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+COLUMNS = {
+    "timestamp": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<i8"),
+}
+VALUE_COLUMNS = [name for name in COLUMNS if name != "timestamp"]
+
+# Symbols become directory names, so keep them boring
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9.\-]{0,9}$")
+
+
+class Bars(NamedTuple):
+    """A run of bars, each field a (possibly memory-mapped) numpy array of the same length."""
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamp)
+
+
+def empty_bars():
+    return Bars(*(np.empty(0, dtype=dtype) for dtype in COLUMNS.values()))
+
+
+class PriceStore:
+    """Per-symbol OHLCV files under one root directory."""
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}  # symbol -> (length, Bars of memmaps)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get("PRICE_HISTORY_DIR", "price_history"))
+
+    def symbols(self):
+        """Every symbol with stored history, sorted."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isfile(self._path(name, "timestamp")))
+
+    def length(self, symbol):
+        """Number of complete bars stored for a symbol."""
+        try:
+            return os.path.getsize(self._path(symbol, "timestamp")) // COLUMNS["timestamp"].itemsize
+        except FileNotFoundError:
+            return 0
+
+    def read(self, symbol):
+        """All bars for a symbol as read-only memmaps (zero copy)."""
+        symbol = self._check(symbol)
+        length = self.length(symbol)
+        if not length:
+            return empty_bars()
+
+        with self._lock:
+            cached = self._maps.get(symbol)
+            if cached and cached[0] == length:
+                return cached[1]
+            # The file grew (or first use): map it again at the new length
+            bars = Bars(*(np.memmap(self._path(symbol, name), dtype=dtype, mode="r", shape=(length,))
+                          for name, dtype in COLUMNS.items()))
+            self._maps[symbol] = (length, bars)
+            return bars
+
+    def range(self, symbol, start=None, end=None):
+        """
+        Bars with start <= timestamp < end (unix seconds, either bound optional).
+
+        Returns views into the memory map, only the pages touched by the binary
+        search and by whatever the caller reads are loaded.
+        """
+        bars = self.read(symbol)
+        first = 0 if start is None else int(np.searchsorted(bars.timestamp, start, side="left"))
+        last = len(bars) if end is None else int(np.searchsorted(bars.timestamp, end, side="left"))
+        return Bars(*(column[first:max(first, last)] for column in bars))
+
+    def last_timestamp(self, symbol):
+        bars = self.read(symbol)
+        return int(bars.timestamp[-1]) if len(bars) else None
+
+    def append(self, symbol, timestamp, open, high, low, close, volume):
+        """
+        Add bars to the end of a symbol's history, returns how many were written.
+
+        Timestamps must be ascending. Bars at or before the last stored timestamp are
+        skipped, so re-ingesting the same file is harmless.
+        """
+        symbol = self._check(symbol)
+        columns = {
+            "timestamp": np.asarray(timestamp, dtype=COLUMNS["timestamp"]),
+            "open": np.asarray(open, dtype=COLUMNS["open"]),
+            "high": np.asarray(high, dtype=COLUMNS["high"]),
+            "low": np.asarray(low, dtype=COLUMNS["low"]),
+            "close": np.asarray(close, dtype=COLUMNS["close"]),
+            "volume": np.asarray(volume, dtype=COLUMNS["volume"]),
+        }
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("all columns must have the same length")
+        if np.any(np.diff(columns["timestamp"]) <= 0):
+            raise ValueError("timestamps must be strictly ascending")
+
+        os.makedirs(os.path.join(self.root, symbol), exist_ok=True)
+        stored = self.length(symbol)
+        if stored:
+            last = self.last_timestamp(symbol)
+            keep = columns["timestamp"] > last
+            columns = {name: values[keep] for name, values in columns.items()}
+        count = len(columns["timestamp"])
+        if not count:
+            return 0
+
+        for name in VALUE_COLUMNS + ["timestamp"]:
+            path = self._path(symbol, name)
+            with open_column(path) as f:
+                # Drop anything past the last complete bar (a crashed append), then add ours
+                f.truncate(stored * COLUMNS[name].itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(columns[name].tobytes())
+                # On disk before the timestamp file says the bars exist
+                f.flush()
+                os.fsync(f.fileno())
+        return count
+
+    def _path(self, symbol, column):
+        return os.path.join(self.root, symbol, f"{column}.{COLUMNS[column].kind}{COLUMNS[column].itemsize}")
+
+    @staticmethod
+    def _check(symbol):
+        symbol = symbol.upper()
+        if not SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f"invalid symbol {symbol!r}")
+        return symbol
+
+
+def open_column(path):
+    """Open a column file for read/write, creating it if needed."""
+    return open(path, "r+b" if os.path.exists(path) else "w+b")
+
+
+store = PriceStore.from_env()
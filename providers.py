@@ -0,0 +1,280 @@
+"""
+Where quotes come from: an ordered list of providers behind lookup().
+
+QUOTE_PROVIDERS names them in priority order, e.g. "finnhub,replay":
+
+- finnhub: the Finnhub API (company name from the symbols table, price from /quote)
+- replay: prices from a local CSV (QUOTE_REPLAY_PATH), for offline runs and load tests
+
+ProviderChain.quote() asks the first provider that is up. A failure moves on to the
+next one straight away. If the current one is just slow (no answer after
+QUOTE_HEDGE_MS), the next one is asked too, a hedged request, and whichever answers
+first wins. The other keeps going in the background and its result still counts for
+its health.
+
+Every provider has its own health: a circuit breaker (QUOTE_PROVIDER_FAILURES in a
+row take it out of the rotation for QUOTE_PROVIDER_COOLDOWN seconds) plus call,
+failure and latency numbers for /health.
+
+"Unknown symbol" is an answer, not a failure. The next provider is still asked (it
+may list more symbols), but only one at a time, and nobody's health suffers.
+"""
+import csv
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app, has_app_context
+
+import finnhub
+from finnhub import CircuitBreaker
+from metrics import metrics
+
+
+class ProviderError(Exception):
+    """Raised when a provider (or every provider in a chain) can't give us a quote."""
+
+
+class ProviderBusy(ProviderError):
+    """Refused locally without asking upstream (quota, open breaker), not held against its health."""
+
+
+class UnknownSymbol(ProviderError):
+    """The provider answered: there is no such symbol."""
+
+
+class ProviderHealth:
+    """Circuit breaker plus running numbers for one provider."""
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.breaker = CircuitBreaker(threshold=threshold, cooldown=cooldown)
+        self.calls = 0
+        self.failures = 0
+        self.latency = None  # moving average, seconds
+        self._lock = threading.Lock()
+
+    def allow(self):
+        return self.breaker.allow()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.calls += 1
+            self.failures += not ok
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.breaker.state, "calls": self.calls, "failures": self.failures,
+                    "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None}
+
+
+class QuoteProvider(ABC):
+    """One source of quotes, `name` is what QUOTE_PROVIDERS and /health call it."""
+
+    name = None
+
+    @abstractmethod
+    def quote(self, symbol):
+        """{"symbol", "name", "price"} for symbol, or raise ProviderError."""
+
+
+class FinnhubProvider(QuoteProvider):
+    """The Finnhub API through finnhub.client (its own retries, breaker and quota apply)."""
+
+    name = "finnhub"
+
+    def __init__(self, company_name):
+        # helpers.get_company_name: the symbols table first, Finnhub's profile2 when it's missing
+        self.company_name = company_name
+
+    def quote(self, symbol):
+        if not os.environ.get("FINNHUB_API_KEY"):
+            raise ProviderError("API key not configured")
+        try:
+            company_name = self.company_name(symbol)
+            if not company_name:
+                raise UnknownSymbol(symbol)
+            price = finnhub.client.get("quote", symbol=symbol).get("c")
+        except (finnhub.CircuitOpenError, finnhub.RateLimitedError) as e:
+            raise ProviderBusy(str(e)) from e
+        except finnhub.FinnhubError as e:
+            raise ProviderError(str(e)) from e
+        if not price:
+            raise UnknownSymbol(symbol)
+        return {"name": company_name, "price": float(price), "symbol": symbol}
+
+
+class ReplayProvider(QuoteProvider):
+    """
+    Quotes from a CSV of symbol,price[,name] rows, no network involved.
+
+    Several rows for one symbol are replayed in file order, one every `step` seconds
+    of wall-clock time (then from the top again), so every worker agrees on the
+    current price.
+    """
+
+    name = "replay"
+
+    def __init__(self, path, step=1.0):
+        if not step > 0:
+            raise ValueError(f"Replay step must be a positive number of seconds (QUOTE_REPLAY_STEP), got {step!r}")
+        self.path = path
+        self.step = step
+        self._series = None
+        self._lock = threading.Lock()
+
+    def quote(self, symbol):
+        series = self._load().get(symbol)
+        if not series:
+            raise UnknownSymbol(symbol)
+        name, prices = series
+        return {"name": name, "price": prices[int(time.time() / self.step) % len(prices)], "symbol": symbol}
+
+    def _load(self):
+        if self._series is None:
+            with self._lock:
+                if self._series is None:
+                    series = {}
+                    try:
+                        with open(self.path, newline="", encoding="utf-8") as f:
+                            for row in csv.DictReader(f):
+                                symbol = row["symbol"].strip().upper()
+                                name, prices = series.setdefault(symbol, [(row.get("name") or symbol).strip(), []])
+                                prices.append(float(row["price"]))
+                    except (OSError, KeyError, ValueError) as e:
+                        raise ProviderError(f"Replay file {self.path}: {e}") from e
+                    self._series = series
+        return self._series
+
+
+class ProviderChain:
+    """Providers in priority order, with failover and hedged requests."""
+
+    def __init__(self, providers, hedge_delay=0.25, threshold=5, cooldown=30):
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.health = {provider.name: ProviderHealth(threshold, cooldown) for provider in providers}
+        # Only hedged lookups use it, a single provider is called on the caller's thread
+        self.pool = ThreadPoolExecutor(max_workers=int(os.environ.get("QUOTE_HEDGE_POOL_SIZE", 8)),
+                                       thread_name_prefix="hedge")
+
+    @classmethod
+    def from_env(cls, company_name):
+        """Build the chain from QUOTE_PROVIDERS and friends, company_name is for Finnhub."""
+        factories = {
+            "finnhub": lambda: FinnhubProvider(company_name),
+            "replay": lambda: ReplayProvider(os.environ.get("QUOTE_REPLAY_PATH", "quotes_replay.csv"),
+                                             step=float(os.environ.get("QUOTE_REPLAY_STEP", 1.0))),
+        }
+        names = [name.strip().lower() for name in os.environ.get("QUOTE_PROVIDERS", "finnhub").split(",")]
+        unknown = [name for name in names if name not in factories]
+        if unknown:
+            raise ValueError(f"Unknown QUOTE_PROVIDERS entries: {', '.join(unknown)}")
+        return cls(
+            [factories[name]() for name in dict.fromkeys(names)],
+            hedge_delay=float(os.environ.get("QUOTE_HEDGE_MS", 250)) / 1000,
+            threshold=int(os.environ.get("QUOTE_PROVIDER_FAILURES", 5)),
+            cooldown=float(os.environ.get("QUOTE_PROVIDER_COOLDOWN", 30)),
+        )
+
+    def quote(self, symbol):
+        """A quote from the first provider to answer, tagged with its "provider"."""
+        if len(self.providers) == 1 or not self.hedge_delay:
+            return self._one_at_a_time(symbol)
+        return self._hedged(symbol)
+
+    def stats(self):
+        return {name: health.stats() for name, health in self.health.items()}
+
+    def _one_at_a_time(self, symbol):
+        errors, unknown = [], False
+        for provider in self.providers:
+            if not self.health[provider.name].allow():
+                errors.append((provider.name, "temporarily unavailable"))
+                continue
+            try:
+                return self._call(provider, symbol)
+            except UnknownSymbol:
+                unknown = True
+            except ProviderError as e:
+                errors.append((provider.name, str(e)))
+        self._give_up(symbol, errors, unknown)
+
+    def _hedged(self, symbol):
+        app = current_app._get_current_object() if has_app_context() else None
+        errors, unknown = [], False
+        waiting = {}
+        queue = list(self.providers)
+
+        def start_next():
+            while queue:
+                provider = queue.pop(0)
+                if self.health[provider.name].allow():
+                    waiting[self.pool.submit(self._call_in_context, app, provider, symbol)] = provider
+                    return provider
+                errors.append((provider.name, "temporarily unavailable"))
+            return None
+
+        start_next()
+        while waiting:
+            # Give the ones already asked hedge_delay to answer before adding another
+            done, _ = wait(waiting, timeout=self.hedge_delay if queue and not unknown else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                hedge = start_next()
+                if hedge is not None:
+                    metrics.registry.inc("quote_hedged_total", provider=hedge.name)
+                continue
+            for future in done:
+                provider = waiting.pop(future)
+                try:
+                    return future.result()
+                except UnknownSymbol:
+                    unknown = True
+                except ProviderError as e:
+                    errors.append((provider.name, str(e)))
+            if not waiting:
+                start_next()
+        self._give_up(symbol, errors, unknown)
+
+    def _give_up(self, symbol, errors, unknown):
+        if unknown and not errors:
+            raise UnknownSymbol(symbol)
+        if len(errors) == 1:
+            # Reads the way a lone Finnhub failure always did
+            raise ProviderError(errors[0][1])
+        raise ProviderError("; ".join(f"{name}: {error}" for name, error in errors)
+                            or "No quote provider available")
+
+    def _call_in_context(self, app, provider, symbol):
+        if app is None:
+            return self._call(provider, symbol)
+        with app.app_context():
+            return self._call(provider, symbol)
+
+    def _call(self, provider, symbol):
+        health = self.health[provider.name]
+        started = time.perf_counter()
+        try:
+            quote = provider.quote(symbol)
+        except UnknownSymbol:
+            health.record(time.perf_counter() - started, ok=True)
+            raise
+        except ProviderBusy:
+            # Nothing went upstream, so nothing was learned about its health
+            health.breaker.release()
+            raise
+        except Exception as e:
+            health.record(time.perf_counter() - started, ok=False)
+            metrics.registry.inc("quote_provider_failures_total", provider=provider.name)
+            if isinstance(e, ProviderError):
+                raise
+            raise ProviderError(str(e)) from e
+        health.record(time.perf_counter() - started, ok=True)
+        return dict(quote, provider=provider.name)
@@ -0,0 +1,238 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class QuoteCache:
+    """
+    Two tier TTL cache for stock quotes.
+
+    The first tier is an in-process LRU dict, the second (optional) tier is a small
+    SQLite file so every gunicorn worker on the box can share what the others fetched.
+    """
+
+    def __init__(self, ttl=15, max_size=1000, shared_path=None, stale_ttl=600):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.shared_path = shared_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "shared_evictions": 0, "expired": 0,
+                       "stale_served": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from QUOTE_CACHE_* environment variables."""
+        return cls(
+            ttl=float(os.environ.get("QUOTE_CACHE_TTL", 15)),
+            max_size=int(os.environ.get("QUOTE_CACHE_SIZE", 1000)),
+            shared_path=os.environ.get("QUOTE_CACHE_DB") or None,
+            stale_ttl=float(os.environ.get("QUOTE_STALE_TTL", 600)),
+        )
+
+    def get(self, symbol):
+        """Return a fresh cached quote for symbol, or None."""
+        symbol = symbol.upper()
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                quote, stored_at = entry
+                if now - stored_at < self.ttl:
+                    self._entries.move_to_end(symbol)
+                    self._stats["hits"] += 1
+                    return dict(quote)
+                # Kept (the LRU still bounds it) in case upstream is busy and get_stale() needs it
+                self._stats["expired"] += 1
+
+        shared = self._shared_get(symbol, now)
+        if shared is not None:
+            quote, stored_at = shared
+            self._remember(symbol, quote, stored_at)
+            with self._lock:
+                self._stats["shared_hits"] += 1
+            return dict(quote)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def get_stale(self, symbol):
+        """
+        Last known quote for symbol even if it is past the TTL (up to stale_ttl), or None.
+
+        Only for when upstream can't be asked right now. The copy comes back marked
+        "stale": True with its age, so callers that trade on it can refuse.
+        """
+        symbol = symbol.upper()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None:
+            entry = self._shared_get(symbol, now, max_age=self.stale_ttl)
+        if entry is None or now - entry[1] >= self.stale_ttl:
+            return None
+        with self._lock:
+            self._stats["stale_served"] += 1
+        quote, stored_at = entry
+        return dict(quote, stale=True, age=round(now - stored_at, 1))
+
+    def set(self, symbol, quote):
+        """Store a successful quote in both tiers."""
+        symbol = symbol.upper()
+        stored_at = time.time()
+        self._remember(symbol, quote, stored_at)
+        self._shared_set(symbol, quote, stored_at)
+
+    def clear(self):
+        """Drop everything from the in-process tier and the shared tier."""
+        with self._lock:
+            self._entries.clear()
+        conn = self._shared_conn()
+        if conn is not None:
+            with conn:
+                conn.execute("DELETE FROM quotes")
+
+    def stats(self):
+        """Return hit/miss/eviction counters for this worker."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, symbol, quote, stored_at):
+        with self._lock:
+            self._entries[symbol] = (dict(quote), stored_at)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # --- shared SQLite tier ---
+
+    def _shared_conn(self):
+        """One connection per thread (and per process, gunicorn forks after import)."""
+        if not self.shared_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        try:
+            conn = sqlite3.connect(self.shared_path, timeout=1)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quotes ("
+                "symbol TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_quotes_last_used ON quotes (last_used)")
+        except sqlite3.Error:
+            # The shared tier is only an optimisation, the memory tier keeps working without it
+            return None
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _shared_get(self, symbol, now, max_age=None):
+        conn = self._shared_conn()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT data, stored_at FROM quotes WHERE symbol = ?", (symbol,)
+            ).fetchone()
+            if row is None or now - row[1] >= (max_age or self.ttl):
+                return None
+            with conn:
+                conn.execute("UPDATE quotes SET last_used = ? WHERE symbol = ?", (now, symbol))
+            return json.loads(row[0]), row[1]
+        except sqlite3.Error:
+            return None
+
+    def _shared_set(self, symbol, quote, stored_at):
+        conn = self._shared_conn()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO quotes (symbol, data, stored_at, last_used) VALUES (?, ?, ?, ?)",
+                    (symbol, json.dumps(quote), stored_at, stored_at),
+                )
+                # Keep the shared tier bounded too, least recently used rows go first
+                evicted = conn.execute(
+                    "DELETE FROM quotes WHERE symbol IN ("
+                    "SELECT symbol FROM quotes ORDER BY last_used ASC "
+                    "LIMIT max((SELECT COUNT(*) FROM quotes) - ?, 0))",
+                    (self.max_size,),
+                ).rowcount
+            if evicted > 0:
+                with self._lock:
+                    self._stats["shared_evictions"] += evicted
+        except sqlite3.Error:
+            pass
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs the function, everyone who asks for the same key
+    while it is running waits for it and gets a copy of its result (or its exception).
+    Per process: across gunicorn workers the shared cache tier does the deduplicating.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args):
+        """fn(*args), unless a call for key is already running, then that call's result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["calls"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return dict(call.result) if isinstance(call.result, dict) else call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
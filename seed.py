@@ -0,0 +1,265 @@
+"""
+Bulk test data for capacity planning: users with realistic trade histories.
+
+`flask seed` generates users a chunk at a time and writes each chunk straight through
+the DBAPI connection, skipping the ORM:
+
+- Postgres: COPY ... FROM STDIN (psycopg 3)
+- SQLite: executemany in large transactions, with synchronous=OFF and a big page
+  cache while it runs (put back afterwards)
+
+Every user's history is internally consistent: sells never exceed what is held,
+buys never exceed cash, and users.cash, users.ledger_version and the positions table
+match the transactions written, so `flask positions verify` passes. Rows are written
+per user in time order, which keeps the transactions indexes append-mostly.
+
+Output is a function of the seed and the options only: user n gets its own
+random.Random, so neither the batch size nor the number of --workers generating in
+parallel changes the data.
+"""
+import math
+import multiprocessing
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+
+from database import db
+from models import Buy, Position, User, apply_trade
+
+
+class SeedOptions:
+    """What to generate, see `flask seed --help` for the meaning of each."""
+
+    def __init__(self, users=1000, trades=100, trade_dist="exponential", max_trades=5000, symbols=500,
+                 symbol_skew=1.1, sell_ratio=0.3, max_shares=50, days=365, cash=10000.0,
+                 password="password", prefix="seed", seed=1):
+        self.users = users
+        self.trades = trades
+        self.trade_dist = trade_dist
+        self.max_trades = max_trades
+        self.symbols = symbols
+        self.symbol_skew = symbol_skew
+        self.sell_ratio = sell_ratio
+        self.max_shares = max_shares
+        self.days = days
+        self.cash = cash
+        self.password = password
+        self.prefix = prefix
+        self.seed = seed
+
+
+def symbol_universe(count, rng, listing=()):
+    """count tickers: from the symbol listing when there is one, made up otherwise."""
+    listed = sorted(symbol for symbol in listing if len(symbol) <= 5 and symbol.isalpha())
+    if len(listed) >= count:
+        return rng.sample(listed, count)
+    made_up = set(listed)
+    while len(made_up) < count:
+        made_up.add("".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=rng.randint(2, 4))))
+    # Shuffled, popularity is by position and shouldn't follow the alphabet
+    symbols = sorted(made_up)
+    rng.shuffle(symbols)
+    return symbols
+
+
+def price_paths(symbols, days, rng):
+    """{symbol: [close per day]}, a geometric random walk from a lognormal starting price."""
+    paths = {}
+    for symbol in symbols:
+        price = min(max(rng.lognormvariate(math.log(60), 1.0), 1.0), 2000.0)
+        closes = []
+        for _ in range(days + 1):
+            closes.append(price)
+            price *= math.exp(rng.gauss(0.0002, 0.02))
+        paths[symbol] = closes
+    return paths
+
+
+def trade_count(rng, options):
+    mean, dist = options.trades, options.trade_dist
+    if dist == "fixed":
+        count = mean
+    elif dist == "uniform":
+        count = rng.randint(0, 2 * mean)
+    elif dist == "exponential":
+        count = int(rng.expovariate(1 / mean)) if mean else 0
+    else:
+        # Heavy tail: most accounts trade a little, a few trade constantly (alpha 1.5, same mean)
+        count = int(rng.paretovariate(1.5) * mean / 3)
+    return min(count, options.max_trades)
+
+
+def generate_user(user_id, rng, options, symbols, cum_weights, paths, dates):
+    """(user row, transaction rows, position rows) for one account. dates[d] is day d as YYYY-MM-DD."""
+    count = trade_count(rng, options)
+    # Microseconds since the first day's midnight, so the day (for the price) falls out of a division
+    offsets = sorted(int(rng.random() * options.days * 86_400_000_000) for _ in range(count))
+    picks = rng.choices(symbols, cum_weights=cum_weights, k=count)
+
+    random_ = rng.random
+    cash = options.cash
+    held = {}
+    trades = []
+    for offset, symbol in zip(offsets, picks):
+        day, micros = divmod(offset, 86_400_000_000)
+        sell = held and random_() < options.sell_ratio
+        if not sell:
+            price = round(paths[symbol][day] * (0.99 + 0.02 * random_()), 2)
+            shares = min(int(random_() * options.max_shares) + 1, int(cash // price))
+            if shares <= 0:
+                if not held:
+                    continue
+                # Out of cash: sell something instead, the way a real account would
+                sell = True
+        if sell:
+            symbol = rng.choice(list(held))
+            price = round(paths[symbol][day] * (0.99 + 0.02 * random_()), 2)
+            shares = -(int(random_() * held[symbol][0]) + 1)
+
+        cash -= shares * price
+        position = apply_trade(*held.get(symbol, (0, 0.0)), shares, price)
+        if position[0] > 0:
+            held[symbol] = position
+        else:
+            held.pop(symbol, None)
+        # strftime per row was the slowest part of generating, this is the same format
+        seconds, micros = divmod(micros, 1_000_000)
+        minutes, seconds = divmod(seconds, 60)
+        timestamp = f"{dates[day]} {minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}.{micros:06d}"
+        trades.append((user_id, symbol, shares, price, timestamp))
+
+    user = (user_id, f"{options.prefix}-{user_id}", round(cash, 2), len(trades))
+    positions = [(user_id, symbol, shares, round(cost, 2)) for symbol, (shares, cost) in held.items()]
+    return user, trades, positions
+
+
+class BulkWriter:
+    """Writes seed rows through the raw DBAPI connection, COPY on Postgres, executemany elsewhere."""
+
+    TABLES = {
+        "users": ("users", ("id", "username", "hash", "cash", "ledger_version")),
+        "transactions": (Buy.__tablename__, ("user_id", "symbol", "shares", "price", "timestamp")),
+        "positions": (Position.__tablename__, ("user_id", "symbol", "shares", "cost_basis")),
+    }
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.conn = engine.raw_connection()
+        self.cursor = self.conn.cursor()
+        self._restore = []
+        if self.dialect == "sqlite":
+            for pragma, value in (("synchronous", "OFF"), ("cache_size", "-262144"), ("temp_store", "MEMORY")):
+                self._restore.append((pragma, self.cursor.execute(f"PRAGMA {pragma}").fetchone()[0]))
+                self.cursor.execute(f"PRAGMA {pragma}={value}")
+
+    def write(self, table, rows):
+        name, columns = self.TABLES[table]
+        if not rows:
+            return
+        if self.dialect == "postgresql":
+            with self.cursor.copy(f"COPY {name} ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            marker = "?" if self.engine.dialect.paramstyle == "qmark" else "%s"
+            self.cursor.executemany(f"INSERT INTO {name} ({', '.join(columns)}) "
+                                    f"VALUES ({', '.join([marker] * len(columns))})", rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        try:
+            if self.dialect == "postgresql":
+                # Explicit user ids went past the sequence, move it along
+                self.cursor.execute("SELECT setval(pg_get_serial_sequence('users', 'id'), "
+                                    "(SELECT max(id) FROM users))")
+            self.cursor.execute("ANALYZE")
+            self.conn.commit()
+            for pragma, value in self._restore:
+                self.cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            self.conn.close()
+
+
+class Generator:
+    """Symbols, price paths and options, everything needed to generate any user on its own."""
+
+    def __init__(self, options, listing=()):
+        rng = random.Random(options.seed)
+        self.options = options
+        self.symbols = symbol_universe(options.symbols, rng, listing)
+        # Zipf popularity: the most traded symbol gets 1, the nth 1/n**skew
+        self.cum_weights = list(accumulate(1 / (rank ** options.symbol_skew)
+                                           for rank in range(1, len(self.symbols) + 1)))
+        self.paths = price_paths(self.symbols, options.days, rng)
+        # UTC, naive, like every other timestamp the app writes
+        first_day = datetime.now(timezone.utc).date() - timedelta(days=options.days)
+        self.dates = [(first_day + timedelta(days=day)).isoformat() for day in range(options.days + 1)]
+        self.password_hash = generate_password_hash(options.password)
+
+    def chunk(self, first_id, start, stop):
+        """Rows for users start..stop-1 (counting from 0), with ids from first_id + start."""
+        users, trades, positions = [], [], []
+        for ordinal in range(start, stop):
+            rng = random.Random(f"{self.options.seed}:{ordinal}")
+            user, user_trades, user_positions = generate_user(first_id + ordinal, rng, self.options, self.symbols,
+                                                              self.cum_weights, self.paths, self.dates)
+            users.append((user[0], user[1], self.password_hash, user[2], user[3]))
+            trades.extend(user_trades)
+            positions.extend(user_positions)
+        return users, trades, positions
+
+
+_generator = None
+
+
+def _init_worker(generator):
+    global _generator
+    _generator = generator
+
+
+def _generate_chunk(args):
+    return _generator.chunk(*args)
+
+
+def seed(options, batch_rows=50_000, workers=1, listing=()):
+    """
+    Generate and write options.users users, yielding (users, transactions, positions)
+    written so far after every commit.
+
+    Generating is the slow part, so with workers > 1 chunks of users are generated in
+    that many processes while this one writes them, in order.
+    """
+    generator = Generator(options, listing)
+    first_id = (db.session.execute(select(func.max(User.id))).scalar() or 0) + 1
+    existing = db.session.execute(select(func.count()).select_from(User)
+                                  .where(User.username.like(f"{options.prefix}-%"))).scalar()
+    if existing:
+        raise ValueError(f"{existing} '{options.prefix}-' users already exist, pick another --prefix")
+    db.session.commit()
+
+    per_chunk = max(1, batch_rows // max(options.trades, 1))
+    chunks = [(first_id, start, min(start + per_chunk, options.users))
+              for start in range(0, options.users, per_chunk)]
+
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(generator,)) if workers > 1 else None
+    writer = BulkWriter(db.engine)
+    totals = (0, 0, 0)
+    try:
+        results = pool.imap(_generate_chunk, chunks) if pool else (generator.chunk(*chunk) for chunk in chunks)
+        for users, trades, positions in results:
+            writer.write("users", users)
+            writer.write("transactions", trades)
+            writer.write("positions", positions)
+            writer.commit()
+            totals = (totals[0] + len(users), totals[1] + len(trades), totals[2] + len(positions))
+            yield totals
+    finally:
+        if pool:
+            pool.terminate()
+        writer.close()
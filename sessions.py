@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+from flask_session import Session
+from flask_session.base import ServerSideSessionInterface
+from flask_session.sqlalchemy import SqlAlchemySessionInterface
+
+from models import SessionRecord
+
+BACKENDS = ("sqlalchemy", "cookie", "filesystem")
+
+# app.py's fallback when SECRET_KEY isn't set. It is public, so nothing signed with it can be trusted
+DEV_SECRET_KEY = "dev-key-change-in-production"
+
+
+def configure(app, db):
+    """
+    Set up the session backend chosen by SESSION_BACKEND.
+
+    sqlalchemy  (default) rows in the `sessions` table on our own database (created by
+                the migrations like every other table), the cookie only carries a random
+                id. Expired rows are deleted by a background thread in every worker
+    cookie      Flask's built-in signed cookie, nothing stored server side. Anyone with
+                the signing key can write themselves a session for any user_id, so this
+                refuses to start without a real SECRET_KEY
+    filesystem  the old flask_session/ directory, kept for local debugging
+    """
+    backend = os.environ.get("SESSION_BACKEND", "sqlalchemy").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"SESSION_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+    if backend == "cookie" and app.config.get("SECRET_KEY") in (None, "", DEV_SECRET_KEY):
+        raise ValueError("SESSION_BACKEND=cookie needs SECRET_KEY set to a real secret, "
+                         "sessions signed with the default key can be forged")
+
+    app.config["SESSION_BACKEND"] = backend
+    app.config["SESSION_PERMANENT"] = False
+    # Also the TTL of server-side rows and the max age checked on signed cookies
+    app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(
+        hours=float(os.environ.get("SESSION_LIFETIME_HOURS", 24)))
+    # Only write the session when it changes, not on every page view. The TTL then
+    # counts from login instead of sliding, which is fine for a trading sim.
+    app.config["SESSION_REFRESH_EACH_REQUEST"] = False
+
+    if backend == "cookie":
+        return
+
+    app.config["SESSION_TYPE"] = backend
+    if backend == "filesystem":
+        Session(app)
+        return
+
+    app.session_interface = SessionTableInterface(app, db, permanent=app.config["SESSION_PERMANENT"])
+    interval = float(os.environ.get("SESSION_GC_INTERVAL", 300))
+    collector = SessionCollector(app, interval)
+    app.before_request(collector.ensure_running)
+
+
+class SessionTableInterface(SqlAlchemySessionInterface):
+    """
+    Flask-Session's sqlalchemy backend on models.SessionRecord.
+
+    The stock interface defines its own model and creates the table when it starts,
+    this one leaves the schema to the migrations like every other table.
+    """
+
+    def __init__(self, app, db, **options):
+        ServerSideSessionInterface.__init__(self, app, **options)
+        self.client = db
+        self.sql_session_model = SessionRecord
+
+
+class SessionCollector:
+    """Deletes expired session rows every `interval` seconds on a daemon thread."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        # Started from the first request rather than at import, threads don't survive gunicorn's fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="session-gc", daemon=True).start()
+
+    def collect(self):
+        """Delete expired rows once."""
+        with self.app.app_context():
+            try:
+                self.app.session_interface._delete_expired_sessions()
+            except Exception as e:
+                self.app.logger.warning(f"⚠️  Session cleanup failed: {e}")
+
+    def _run(self):
+        while True:
+            self.collect()
+            time.sleep(self.interval)
@@ -0,0 +1,84 @@
+"""
+Database setup that runs once per deploy instead of once per gunicorn worker.
+
+`upgrade_database()` takes an advisory lock (pg_advisory_lock on Postgres, a file
+lock next to the database on SQLite), checks whether the schema is already at the
+Alembic head and only then runs the migrations. Several processes starting at once,
+say gunicorn masters in a few containers, queue on the lock. The first one migrates
+and the rest see the head and move on.
+
+Called from gunicorn.conf.py (on_starting, in the master before any worker forks)
+and from `flask setup-db` for release steps.
+"""
+import os
+from contextlib import contextmanager
+
+from flask import current_app
+from flask_migrate import upgrade
+from sqlalchemy import text
+
+from database import db
+
+try:
+    import fcntl
+except ImportError:  # Windows, no file locks, dev only anyway
+    fcntl = None
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Any constant works as long as every process of this app agrees on it
+MIGRATION_LOCK_ID = 0x46494E414E4345
+
+
+def upgrade_database(app):
+    """Bring the schema to the Alembic head, at most one process at a time. True if anything ran."""
+    with app.app_context():
+        with migration_lock(db.engine):
+            current, heads = schema_revisions()
+            if current == heads:
+                app.logger.info(f"✅ Database already at {', '.join(sorted(heads))}, nothing to migrate")
+                return False
+            app.logger.info(f"🔄 Migrating database {', '.join(sorted(current)) or '(empty)'} → "
+                            f"{', '.join(sorted(heads))}")
+            upgrade(directory=MIGRATIONS_DIR)
+            app.logger.info("✅ Database migrations applied successfully!")
+            return True
+
+
+def schema_revisions():
+    """(revisions the database is at, head revisions of the migration scripts)"""
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = current_app.extensions["migrate"].migrate.get_config(MIGRATIONS_DIR)
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    with db.engine.connect() as conn:
+        current = set(MigrationContext.configure(conn).get_current_heads())
+    return current, heads
+
+
+@contextmanager
+def migration_lock(engine):
+    """Hold an exclusive, cross-process lock for the duration of a migration."""
+    if engine.dialect.name == "postgresql":
+        # Session-level advisory lock, released explicitly (or when the connection dies)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                conn.commit()
+        return
+
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield
+        return
+
+    with open(f"{database}.migrate-lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -1,5 +1,6 @@
 // --- Configuration ---
 const FLASH_AUTOHIDE_DELAY = 5000;
+const PORTFOLIO_POLL_INTERVAL = 30000;
 
 function hideAlert() {
   const alertContainer = document.querySelector("#global-alert-container");
@@ -37,8 +38,134 @@ document.addEventListener("DOMContentLoaded", () => {
     "change-confirmation",
     "changeSubmitBtn",
   );
+
+  startPortfolioStream();
+  loadAnalytics();
+  setupSymbolSearch();
+});
+
+// --- Ticker autocomplete, answered from the server's in-memory symbol index ---
+function setupSymbolSearch() {
+  const input = document.querySelector('input[list="symbol-options"]');
+  const options = document.querySelector("#symbol-options");
+  if (!input || !options) return;
+
+  let timer;
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    const query = input.value.trim();
+    if (!query) return;
+    timer = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          `/api/v1/symbols?q=${encodeURIComponent(query)}`,
+        );
+        if (!response.ok) return;
+        const { matches } = await response.json();
+        options.replaceChildren(
+          ...matches.map(({ symbol, name }) => {
+            const option = document.createElement("option");
+            option.value = symbol;
+            option.label = name;
+            return option;
+          }),
+        );
+      } catch (error) {
+        console.warn("Symbol search failed", error);
+      }
+    }, 150);
+  });
+}
+
+// --- Live portfolio updates (Server-Sent Events) ---
+const usdFormatter = new Intl.NumberFormat("en-US", {
+  style: "currency",
+  currency: "USD",
 });
 
+function startPortfolioStream() {
+  const table = document.querySelector("#holdings-table");
+  if (!table || !window.EventSource) return;
+  if (!table.querySelector("tr[data-symbol]")) return;
+
+  const source = new EventSource("/stream/portfolio");
+  source.addEventListener("message", (event) => {
+    const update = JSON.parse(event.data);
+    showPrices(table, update.prices, update.total);
+  });
+
+  // A 503 (every stream slot on the server taken) closes the EventSource for good,
+  // keep the page current by polling the API instead
+  source.addEventListener("error", () => {
+    if (source.readyState === EventSource.CLOSED) {
+      startPortfolioPolling(table);
+    }
+  });
+
+  // Leaving the page closes the stream so the server can drop the subscription
+  window.addEventListener("beforeunload", () => source.close());
+}
+
+function startPortfolioPolling(table) {
+  setInterval(async () => {
+    try {
+      const response = await fetch("/api/v1/portfolio");
+      if (!response.ok) return;
+      const portfolio = await response.json();
+      const prices = Object.fromEntries(
+        portfolio.holdings.map(({ symbol, price }) => [symbol, price]),
+      );
+      showPrices(table, prices, portfolio.total_value);
+    } catch (error) {
+      console.warn("Could not refresh portfolio", error);
+    }
+  }, PORTFOLIO_POLL_INTERVAL);
+}
+
+function showPrices(table, prices, totalValue) {
+  for (const [symbol, price] of Object.entries(prices)) {
+    const row = table.querySelector(`tr[data-symbol="${symbol}"]`);
+    if (!row) continue;
+    const shares = parseInt(row.dataset.shares);
+    row.querySelector(".js-price").textContent = usdFormatter.format(price);
+    row.querySelector(".js-value").textContent = usdFormatter.format(
+      shares * price,
+    );
+  }
+
+  const total = document.querySelector("#portfolio-total");
+  if (total && totalValue !== undefined) {
+    total.textContent = usdFormatter.format(totalValue);
+  }
+}
+
+// --- Cost basis / P&L card, filled from the JSON API ---
+async function loadAnalytics() {
+  const card = document.querySelector("#analytics-card");
+  if (!card) return;
+
+  try {
+    const response = await fetch("/api/v1/analytics");
+    if (!response.ok) return;
+    const analytics = await response.json();
+    if (!analytics.symbols.length) return;
+
+    card.querySelectorAll("[data-total]").forEach((cell) => {
+      const amount = analytics.totals[cell.dataset.total];
+      cell.textContent = usdFormatter.format(amount);
+      if (cell.dataset.total.startsWith("realized") || cell.dataset.total.startsWith("unrealized")) {
+        cell.classList.add(amount < 0 ? "text-danger" : "text-success");
+      }
+    });
+    const twr = analytics.time_weighted_return;
+    document.querySelector("#analytics-twr").textContent =
+      `${(twr * 100).toFixed(2)}%`;
+    card.classList.remove("d-none");
+  } catch (error) {
+    console.warn("Could not load analytics", error);
+  }
+}
+
 // Add password validation for forms that need it
 function setupPasswordValidation(
   formId,
@@ -0,0 +1,153 @@
+"""
+Every tradable ticker, searchable by prefix without leaving the process.
+
+The universe comes from a listing file (SYMBOL_LIST_PATH, a CSV of symbol,name),
+written by `flask symbols refresh` from Finnhub's stock/symbol endpoint. Loaded, it
+is two sorted arrays searched with bisect:
+
+- tickers, for "AA" -> AA, AAL, AAPL, ...
+- every word of every company name, for "appl" -> Apple Inc, Applied Materials, ...
+
+A prefix is one binary search plus a short scan, a few microseconds for ~30k tickers.
+The same arrays answer "is this a real ticker?", so lookup() can turn a typo away
+without spending Finnhub quota. Without a listing file nothing is rejected.
+
+Workers notice a refreshed file by its mtime (checked at most every
+SYMBOL_LIST_CHECK seconds) and swap the new index in whole.
+"""
+import csv
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+class SymbolIndex:
+    """Sorted tickers and name words from a listing file, reloaded when the file changes."""
+
+    def __init__(self, path=None, check_interval=30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        # (symbols, names, words, word_rows), replaced as a whole so readers need no lock
+        self._data = ([], [], [], array("I"))
+
+    @classmethod
+    def from_env(cls):
+        """Build the index from SYMBOL_LIST_* environment variables."""
+        return cls(
+            path=os.environ.get("SYMBOL_LIST_PATH", "symbol_list.csv"),
+            check_interval=float(os.environ.get("SYMBOL_LIST_CHECK", 30)),
+        )
+
+    def __len__(self):
+        self._maybe_reload()
+        return len(self._data[0])
+
+    def tickers(self):
+        """Every ticker in the listing, sorted."""
+        self._maybe_reload()
+        return list(self._data[0])
+
+    def known(self, symbol):
+        """True/False for a ticker, or None when there is no listing to check against."""
+        self._maybe_reload()
+        symbols = self._data[0]
+        if not symbols:
+            return None
+        symbol = symbol.upper()
+        i = bisect_left(symbols, symbol)
+        return i < len(symbols) and symbols[i] == symbol
+
+    def search(self, query, limit=10):
+        """[(symbol, name)]: exact ticker first, then ticker prefixes, then name-word prefixes."""
+        self._maybe_reload()
+        symbols, names, words, word_rows = self._data
+        query = query.strip()
+        if not query or not symbols:
+            return []
+
+        rows = {}
+        prefix = query.upper()
+        i = bisect_left(symbols, prefix)
+        while i < len(symbols) and len(rows) < limit and symbols[i].startswith(prefix):
+            rows[i] = None
+            i += 1
+
+        # Names match on their words, every word of the query has to start one of them
+        terms = WORD.findall(query.lower())
+        if terms and len(rows) < limit:
+            first, rest = terms[0], terms[1:]
+            j = bisect_left(words, first)
+            while j < len(words) and len(rows) < limit and words[j].startswith(first):
+                row = word_rows[j]
+                if row not in rows and all(_has_word(names[row], term) for term in rest):
+                    rows[row] = None
+                j += 1
+
+        return [(symbols[row], names[row]) for row in rows]
+
+    def load(self, path=None):
+        """(Re)build the index from a listing file, returns the number of tickers."""
+        path = path or self.path
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, newline="", encoding="utf-8") as f:
+            listing = {}
+            for row in csv.DictReader(f):
+                symbol = (row.get("symbol") or "").strip().upper()
+                if symbol:
+                    listing[symbol] = (row.get("name") or "").strip()
+
+        symbols = sorted(listing)
+        names = [listing[symbol] for symbol in symbols]
+        pairs = sorted((word, row) for row, name in enumerate(names) for word in set(WORD.findall(name.lower())))
+        self._data = (symbols, names, [word for word, _ in pairs], array("I", (row for _, row in pairs)))
+        self._mtime = mtime
+        return len(symbols)
+
+    def stats(self):
+        symbols, _, words, _ = self._data
+        return {"symbols": len(symbols), "words": len(words), "path": self.path}
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.path or now - self._checked_at < self.check_interval:
+            return
+        # One thread checks, the others keep using what is loaded
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return
+            if mtime != self._mtime:
+                self.load()
+        except (OSError, csv.Error, UnicodeDecodeError):
+            pass
+        finally:
+            self._lock.release()
+
+
+def _has_word(name, term):
+    return any(word.startswith(term) for word in WORD.findall(name.lower()))
+
+
+def write_listing(path, rows):
+    """Write (symbol, name) rows as a listing file, atomically so workers never read half of one."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "name"])
+        writer.writerows(sorted(rows))
+    os.replace(tmp, path)
+
+
+symbol_index = SymbolIndex.from_env()